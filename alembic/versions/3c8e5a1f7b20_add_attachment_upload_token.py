@@ -0,0 +1,32 @@
+"""Add attachment upload token
+
+Revision ID: 3c8e5a1f7b20
+Revises: fdf0da78ca9b
+Create Date: 2026-10-19 10:12:37.402915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3c8e5a1f7b20"
+down_revision: Union[str, None] = "fdf0da78ca9b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "attachment", sa.Column("upload_token", sa.String(length=32), nullable=True)
+    )
+    # staging files of unfinished uploads were named by id and lived under the
+    # media root, those sessions cannot be resumed and simply expire
+    op.execute("UPDATE attachment SET upload_token = md5(random()::text)")
+    op.alter_column("attachment", "upload_token", nullable=False)
+
+
+def downgrade() -> None:
+    op.drop_column("attachment", "upload_token")
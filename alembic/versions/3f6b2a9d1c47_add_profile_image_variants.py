@@ -0,0 +1,26 @@
+"""Add profile image variants
+
+Revision ID: 3f6b2a9d1c47
+Revises: 8c41d2e7a9f3
+Create Date: 2026-10-18 14:03:12.504118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f6b2a9d1c47"
+down_revision: Union[str, None] = "8c41d2e7a9f3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("profile", sa.Column("image_variants", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("profile", "image_variants")
@@ -0,0 +1,43 @@
+"""Add trigram search indexes
+
+Revision ID: 8c41d2e7a9f3
+Revises: 55099d73bb73
+Create Date: 2026-10-18 10:12:40.318220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8c41d2e7a9f3"
+down_revision: Union[str, None] = "55099d73bb73"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TRIGRAM_INDEXES = [
+    ("ix_province_name_trgm", "province", "name"),
+    ("ix_city_name_trgm", "city", "name"),
+    ("ix_user_username_trgm", "user", "username"),
+    ("ix_user_phone_number_trgm", "user", "phone_number"),
+]
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        op.create_index(
+            name,
+            table,
+            [column],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_ops={column: "gin_trgm_ops"},
+        )
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(TRIGRAM_INDEXES):
+        op.drop_index(name, table_name=table)
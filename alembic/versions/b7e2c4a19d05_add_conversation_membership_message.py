@@ -0,0 +1,85 @@
+"""Add conversation membership message
+
+Revision ID: b7e2c4a19d05
+Revises: 3f6b2a9d1c47
+Create Date: 2026-10-18 17:21:45.902317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e2c4a19d05"
+down_revision: Union[str, None] = "3f6b2a9d1c47"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# a partition's remainder is fixed once rows are routed to it, changing the
+# count later means moving every message
+MESSAGE_PARTITIONS = 16
+
+
+def upgrade() -> None:
+    op.create_table(
+        "conversation",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String(length=100), nullable=True),
+        sa.Column("created_by", sa.Integer(), nullable=True),
+        sa.Column("created", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["created_by"], ["user.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_conversation_id"), "conversation", ["id"], unique=False)
+    op.create_table(
+        "membership",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("conversation_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("joined", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["conversation_id"], ["conversation.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "conversation_id", "user_id", name="_conversation_id_user_id"
+        ),
+    )
+    op.create_index(op.f("ix_membership_id"), "membership", ["id"], unique=False)
+    op.create_index(
+        op.f("ix_membership_user_id"), "membership", ["user_id"], unique=False
+    )
+    op.create_table(
+        "message",
+        sa.Column("conversation_id", sa.Integer(), nullable=False),
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("sender_id", sa.Integer(), nullable=True),
+        sa.Column("body", sa.Text(), nullable=False),
+        sa.Column("client_id", sa.String(length=64), nullable=True),
+        sa.Column("created", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["conversation_id"], ["conversation.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["sender_id"], ["user.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("conversation_id", "id"),
+        postgresql_partition_by="HASH (conversation_id)",
+    )
+    for remainder in range(MESSAGE_PARTITIONS):
+        op.execute(
+            f"CREATE TABLE message_p{remainder} PARTITION OF message "
+            f"FOR VALUES WITH (MODULUS {MESSAGE_PARTITIONS}, REMAINDER {remainder})"
+        )
+
+
+def downgrade() -> None:
+    # dropping the parent drops its partitions
+    op.drop_table("message")
+    op.drop_index(op.f("ix_membership_user_id"), table_name="membership")
+    op.drop_index(op.f("ix_membership_id"), table_name="membership")
+    op.drop_table("membership")
+    op.drop_index(op.f("ix_conversation_id"), table_name="conversation")
+    op.drop_table("conversation")
@@ -0,0 +1,33 @@
+"""Add delivery cursor
+
+Revision ID: b7f986c4e628
+Revises: d41a8f6c2e93
+Create Date: 2026-10-18 20:44:03.170853
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7f986c4e628"
+down_revision: Union[str, None] = "d41a8f6c2e93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "delivery_cursor",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("message_id", sa.BigInteger(), nullable=False),
+        sa.Column("updated", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("delivery_cursor")
@@ -0,0 +1,76 @@
+"""Add membership inbox columns
+
+Revision ID: d41a8f6c2e93
+Revises: b7e2c4a19d05
+Create Date: 2026-10-18 19:05:27.114082
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d41a8f6c2e93"
+down_revision: Union[str, None] = "b7e2c4a19d05"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "membership", sa.Column("last_message_id", sa.BigInteger(), nullable=True)
+    )
+    op.add_column(
+        "membership", sa.Column("last_activity", sa.DateTime(), nullable=True)
+    )
+    op.add_column(
+        "membership",
+        sa.Column("unread_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "membership",
+        sa.Column("last_read_message_id", sa.BigInteger(), nullable=True),
+    )
+    # existing members have read nothing yet
+    op.execute(
+        """
+        UPDATE membership AS m
+        SET last_message_id = latest.id,
+            last_activity = latest.created,
+            unread_count = (
+                SELECT count(*) FROM message
+                WHERE message.conversation_id = m.conversation_id
+                AND message.sender_id IS DISTINCT FROM m.user_id
+            )
+        FROM (
+            SELECT DISTINCT ON (conversation_id) conversation_id, id, created
+            FROM message
+            ORDER BY conversation_id, id DESC
+        ) AS latest
+        WHERE latest.conversation_id = m.conversation_id
+        """
+    )
+    op.execute(
+        "UPDATE membership SET last_activity = coalesce(joined, now()) "
+        "WHERE last_activity IS NULL"
+    )
+    op.alter_column("membership", "last_activity", nullable=False)
+    op.alter_column("membership", "unread_count", server_default=None)
+    op.drop_index("ix_membership_user_id", table_name="membership")
+    op.create_index(
+        "ix_membership_user_id_last_activity",
+        "membership",
+        ["user_id", sa.text("last_activity DESC"), sa.text("conversation_id DESC")],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_membership_user_id_last_activity", table_name="membership")
+    op.create_index("ix_membership_user_id", "membership", ["user_id"], unique=False)
+    op.drop_column("membership", "last_read_message_id")
+    op.drop_column("membership", "unread_count")
+    op.drop_column("membership", "last_activity")
+    op.drop_column("membership", "last_message_id")
@@ -0,0 +1,47 @@
+"""Keep delivery position per membership
+
+Revision ID: d81ccbd2bcbd
+Revises: 3c8e5a1f7b20
+Create Date: 2026-10-18 07:00:45.517655
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d81ccbd2bcbd"
+down_revision: Union[str, None] = "3c8e5a1f7b20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "membership", sa.Column("delivered_message_id", sa.BigInteger(), nullable=True)
+    )
+    op.execute(
+        "UPDATE membership SET delivered_message_id = "
+        "LEAST(delivery_cursor.message_id, membership.last_message_id) "
+        "FROM delivery_cursor WHERE delivery_cursor.user_id = membership.user_id"
+    )
+    op.drop_table("delivery_cursor")
+
+
+def downgrade() -> None:
+    op.create_table(
+        "delivery_cursor",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("message_id", sa.BigInteger(), nullable=False),
+        sa.Column("updated", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.execute(
+        "INSERT INTO delivery_cursor (user_id, message_id, updated) "
+        "SELECT user_id, MAX(delivered_message_id), now() FROM membership "
+        "WHERE delivered_message_id IS NOT NULL GROUP BY user_id"
+    )
+    op.drop_column("membership", "delivered_message_id")
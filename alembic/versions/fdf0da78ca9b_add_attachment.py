@@ -0,0 +1,52 @@
+"""Add attachment
+
+Revision ID: fdf0da78ca9b
+Revises: b7f986c4e628
+Create Date: 2026-10-18 21:32:51.604219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "fdf0da78ca9b"
+down_revision: Union[str, None] = "b7f986c4e628"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "attachment",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("owner_id", sa.Integer(), nullable=False),
+        sa.Column("filename", sa.String(length=255), nullable=False),
+        sa.Column("content_type", sa.String(length=100), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("offset", sa.BigInteger(), nullable=False),
+        sa.Column("checksum", sa.String(length=64), nullable=True),
+        sa.Column("path", sa.String(), nullable=True),
+        sa.Column("created", sa.DateTime(), nullable=True),
+        sa.Column("updated", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["owner_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_attachment_id"), "attachment", ["id"], unique=False)
+    op.create_index("ix_attachment_path", "attachment", ["path"], unique=False)
+    op.create_index(
+        "ix_attachment_updated_pending",
+        "attachment",
+        ["updated"],
+        unique=False,
+        postgresql_where=sa.text("path IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_attachment_updated_pending", table_name="attachment")
+    op.drop_index("ix_attachment_path", table_name="attachment")
+    op.drop_index(op.f("ix_attachment_id"), table_name="attachment")
+    op.drop_table("attachment")
@@ -1,12 +1,44 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
 from decouple import config
 
+from app.helpers.pool_metrics import MeteredAsyncAdaptedQueuePool, MeteredQueuePool
+
 
 DATABASE_URL = config("DATABASE")
+ECHO = config("ECHO", default=False, cast=bool)
+
+# when enabled the read paths of /base and /users are served by the async routers
+DB_ASYNC_MODE = config("DB_ASYNC_MODE", default=False, cast=bool)
+ASYNC_DATABASE_URL = config(
+    "ASYNC_DATABASE",
+    default=make_url(DATABASE_URL)
+    .set(drivername="postgresql+psycopg")
+    .render_as_string(hide_password=False),
+)
+
+# size the pool against the threadpool width (40 by default), otherwise
+# requests queue up waiting for a connection
+POOL_OPTIONS = {
+    "pool_size": config("DB_POOL_SIZE", default=5, cast=int),
+    "max_overflow": config("DB_POOL_MAX_OVERFLOW", default=10, cast=int),
+    "pool_timeout": config("DB_POOL_TIMEOUT", default=30, cast=float),
+    "pool_recycle": config("DB_POOL_RECYCLE", default=-1, cast=int),
+    "pool_pre_ping": config("DB_POOL_PRE_PING", default=False, cast=bool),
+}
 
 # create a postgres engine instance
-engine = create_engine(DATABASE_URL, echo=config("ECHO", default=False, cast=bool))
+engine = create_engine(
+    DATABASE_URL, echo=ECHO, poolclass=MeteredQueuePool, **POOL_OPTIONS
+)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=ECHO,
+    poolclass=MeteredAsyncAdaptedQueuePool,
+    **POOL_OPTIONS,
+)
 
 
 # Create declarative base meta instance
@@ -15,6 +47,7 @@ class Base(DeclarativeBase):
 
 
 SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
 
 
 def get_session():
@@ -23,3 +56,12 @@ def get_session():
         yield session
     finally:
         session.close()
+
+
+async def get_async_session():
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+def pool_status():
+    return {"sync": engine.pool.metrics(), "async": async_engine.pool.metrics()}
@@ -0,0 +1,219 @@
+import hashlib
+import mimetypes
+import os
+import secrets
+from pathlib import Path, PurePosixPath
+
+from decouple import config
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.database import AsyncSessionLocal
+from app.helpers.helper_func import release_connection
+from app.helpers.media_store import (
+    STAGING_DIR,
+    UPLOAD_PREFIX,
+    blob_key,
+    media_path,
+    media_url,
+)
+from app.helpers.uploads import UPLOAD_CHUNK_SIZE, StagedUpload
+from app.models.chat import Attachment
+
+
+# the most one append may carry; clients pick any chunk size up to it
+ATTACHMENT_CHUNK_SIZE = config(
+    "ATTACHMENT_CHUNK_SIZE", default=8 * 1024 * 1024, cast=int
+)
+# extensions kept on the stored blob, anything else is stored as .bin and
+# served as application/octet-stream, so an upload never renders as a page
+ATTACHMENT_EXTENSIONS = {
+    "jpg",
+    "jpeg",
+    "png",
+    "gif",
+    "webp",
+    "bmp",
+    "pdf",
+    "txt",
+    "mp3",
+    "m4a",
+    "ogg",
+    "wav",
+    "mp4",
+    "mov",
+    "webm",
+    "zip",
+}
+
+
+def upload_path(attachment: Attachment) -> Path:
+    return STAGING_DIR / f"{UPLOAD_PREFIX}{attachment.upload_token}.part"
+
+
+def attachment_extension(filename: str) -> str:
+    extension = PurePosixPath(filename).suffix.lower().lstrip(".")
+    return extension if extension in ATTACHMENT_EXTENSIONS else "bin"
+
+
+def attachment_content_type(filename: str) -> str:
+    return (
+        mimetypes.guess_type(f"x.{attachment_extension(filename)}")[0]
+        or "application/octet-stream"
+    )
+
+
+def attachment_item(attachment: Attachment) -> dict:
+    return {
+        "id": attachment.id,
+        "filename": attachment.filename,
+        "content_type": attachment.content_type,
+        "size": attachment.size,
+        "offset": attachment.offset,
+        "complete": attachment.path is not None,
+        "url": media_url(attachment.path),
+        "chunk_size": ATTACHMENT_CHUNK_SIZE,
+    }
+
+
+def create_upload(db: Session, owner_id: int, request) -> Attachment:
+    """Starts an upload session: the row, and an empty staging file that
+    chunks are written into in place."""
+    attachment = Attachment(
+        owner_id=owner_id,
+        filename=request.filename,
+        content_type=attachment_content_type(request.filename),
+        size=request.size,
+        checksum=request.checksum,
+        upload_token=secrets.token_hex(16),
+    )
+    STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    upload_path(attachment).touch()
+    db.add(attachment)
+    db.commit()
+    return attachment
+
+
+def get_upload(db: Session, attachment_id: int, owner_id: int) -> Attachment:
+    attachment = db.get(Attachment, attachment_id)
+    if attachment is None or attachment.owner_id != owner_id:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return attachment
+
+
+def conflict(attachment: Attachment, detail: str) -> HTTPException:
+    # the client resumes from the offset in the response
+    return HTTPException(
+        status_code=409,
+        detail=detail,
+        headers={"Upload-Offset": str(attachment.offset)},
+    )
+
+
+async def append_chunk(
+    attachment_id: int, owner_id: int, offset: int, checksum: str, request: Request
+) -> Attachment:
+    """Writes the request body at `offset` of the staging file as it arrives,
+    hashing it on the way, and moves the session's offset past it once the
+    chunk's SHA-256 matches `checksum`.
+
+    A chunk not at the session's offset is refused with 409 and the current
+    offset, so a client that lost a response just resends from there. The
+    database is not used while the body streams in. Every chunk of a session
+    has to reach a worker that shares the staging directory."""
+    async with AsyncSessionLocal() as session:
+        attachment = await session.get(Attachment, attachment_id)
+    if attachment is None or attachment.owner_id != owner_id:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if attachment.path is not None:
+        raise conflict(attachment, "Upload is already complete")
+    if offset != attachment.offset:
+        raise conflict(attachment, "Offset does not match the upload")
+    limit = min(ATTACHMENT_CHUNK_SIZE, attachment.size - offset)
+    try:
+        length = int(request.headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length")
+    if length > limit:
+        raise HTTPException(status_code=413, detail="Chunk is too large.")
+    path = upload_path(attachment)
+    try:
+        buffer = await run_in_threadpool(open, path, "r+b")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload expired")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        buffer.seek(offset)
+        async for piece in request.stream():
+            size += len(piece)
+            if size > limit:
+                raise HTTPException(status_code=413, detail="Chunk is too large.")
+            digest.update(piece)
+            await run_in_threadpool(buffer.write, piece)
+        if digest.hexdigest() != checksum:
+            raise HTTPException(status_code=400, detail="Chunk checksum mismatch")
+        await run_in_threadpool(buffer.flush)
+    finally:
+        # a failed chunk's bytes are past the offset, the retry overwrites them
+        await run_in_threadpool(buffer.close)
+
+    async with AsyncSessionLocal() as session:
+        moved = await session.execute(
+            update(Attachment)
+            .where(Attachment.id == attachment_id, Attachment.offset == offset)
+            .values(offset=offset + size)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+    if not moved.rowcount:
+        raise conflict(attachment, "Offset does not match the upload")
+    attachment.offset = offset + size
+    return attachment
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as buffer:
+        while chunk := buffer.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def complete_upload(db: Session, attachment: Attachment) -> Attachment:
+    """Publishes the staging file once every byte arrived. It becomes the
+    blob as it is (a rename with local storage, the S3 multipart upload
+    otherwise), nothing is assembled from parts."""
+    if attachment.path is not None:
+        return attachment
+    if attachment.offset != attachment.size:
+        raise conflict(attachment, "Upload is not complete")
+    path = upload_path(attachment)
+    # no pooled connection is held while the file is hashed
+    release_connection(db)
+    try:
+        os.truncate(path, attachment.size)
+        digest = file_digest(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload expired")
+    if attachment.checksum and digest != attachment.checksum:
+        # a corrupt file cannot be resumed, the client starts over
+        db.delete(attachment)
+        db.commit()
+        os.unlink(path)
+        raise HTTPException(status_code=400, detail="File checksum mismatch")
+    key = blob_key(digest, attachment_extension(attachment.filename))
+    attachment.path = media_path(key)
+    # the staging file is kept if the commit fails, so completing can be retried
+    db.commit()
+    try:
+        StagedUpload(path, key, attachment.content_type).publish()
+    except BaseException:
+        # publishing leaves the staging file in place when it fails, the
+        # session goes back to unfinished so that completing can be retried
+        attachment.path = None
+        db.commit()
+        raise
+    return attachment
@@ -1,3 +1,4 @@
+import hashlib
 import time
 
 import jwt
@@ -5,10 +6,15 @@ from decouple import config
 from fastapi import HTTPException, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
+from .cache import TTLCache
+
 
 JWT_SECRET = config("secret")
 JWT_ALGORITHM = config("algorithm")
 
+# verified payloads keyed on the token digest, each kept until its "expires"
+token_cache = TTLCache(maxsize=config("TOKEN_CACHE_SIZE", default=10000, cast=int))
+
 
 def token_response(token: str):
     return {"access_token": token}
@@ -38,6 +44,16 @@ def decode_jwt(token: str) -> dict:
         return {}
 
 
+def decode_jwt_cached(token: str) -> dict:
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is None:
+        payload = decode_jwt(token)
+        if payload:
+            token_cache.set(key, payload, ttl=payload["expires"] - time.time())
+    return payload
+
+
 class JWTBearer(HTTPBearer):
     def __init__(self, auto_error: bool = True):
         super(JWTBearer, self).__init__(auto_error=auto_error)
@@ -64,7 +80,7 @@ class JWTBearer(HTTPBearer):
 
     def verify_jwt(self, jwtoken: str) -> bool:
         try:
-            payload = decode_jwt(jwtoken)
+            payload = decode_jwt_cached(jwtoken)
         except Exception:
             payload = None
         if payload:
@@ -0,0 +1,331 @@
+import asyncio
+import logging
+import uuid
+from collections import Counter, defaultdict
+from enum import Enum
+from functools import lru_cache
+from typing import Iterator
+
+from decouple import config
+from sqlalchemy.engine import make_url
+
+from app.database import DATABASE_URL
+from app.interface.chat_broker_interface import ChatBrokerInterface
+
+
+logger = logging.getLogger(__name__)
+
+
+class BrokerBackend(str, Enum):
+    memory = "memory"
+    postgres = "postgres"
+
+
+CHAT_BROKER = config("CHAT_BROKER", default="memory", cast=BrokerBackend)
+BROKER_CHANNEL_PREFIX = config("BROKER_CHANNEL_PREFIX", default="chat")
+# how long the flusher waits for more frames before sending a batch; 0 still
+# batches everything published in the same event loop iteration, and whatever
+# arrives while a batch is in flight goes out with the next one
+BROKER_FLUSH_INTERVAL = config("BROKER_FLUSH_INTERVAL", default=0, cast=float)
+BROKER_RECONNECT_DELAY = config("BROKER_RECONNECT_DELAY", default=1, cast=float)
+
+# NOTIFY payloads must be shorter than 8000 bytes
+NOTIFY_PAYLOAD_LIMIT = 7900
+WORKER_ID_LENGTH = 12
+HEADER_LENGTH = WORKER_ID_LENGTH + 5
+
+
+def conversation_channel(conversation_id: int) -> str:
+    return f"{BROKER_CHANNEL_PREFIX}_c{conversation_id}"
+
+
+def user_channel(user_id: int) -> str:
+    return f"{BROKER_CHANNEL_PREFIX}_u{user_id}"
+
+
+def service_channel(name: str) -> str:
+    # for workers talking to each other rather than to sockets
+    return f"{BROKER_CHANNEL_PREFIX}_{name}"
+
+
+class InMemoryBroker(ChatBrokerInterface):
+    """Single process runs: publishing is a direct call to the handler."""
+
+    def __init__(self):
+        self.handler = None
+        self.refcounts = Counter()
+        self.published = 0
+
+    async def start(self, handler):
+        self.handler = handler
+
+    async def stop(self):
+        self.handler = None
+
+    def subscribe(self, channel):
+        self.refcounts[channel] += 1
+
+    def unsubscribe(self, channel):
+        self.refcounts[channel] -= 1
+        if self.refcounts[channel] <= 0:
+            del self.refcounts[channel]
+
+    def publish(self, channel, frame):
+        self.published += 1
+        if self.handler is not None:
+            self.handler(channel, frame)
+
+    def stats(self):
+        return {
+            "backend": BrokerBackend.memory,
+            "channels": len(self.refcounts),
+            "published": self.published,
+        }
+
+
+def split_utf8(data: bytes, size: int) -> Iterator[str]:
+    # cuts on character boundaries, a continuation byte never starts a chunk
+    start = 0
+    while start < len(data):
+        end = min(start + size, len(data))
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+        yield data[start:end].decode()
+        start = end
+
+
+class PostgresBroker(ChatBrokerInterface):
+    """Fan-out between workers through LISTEN/NOTIFY on the application's own
+    database, so no extra service is needed.
+
+    A worker LISTENs only on the channels of conversations and users it holds
+    sockets for, refcounted so the LISTEN is issued by the first subscriber
+    and the UNLISTEN by the last one. Frames are delivered to local sockets
+    straight away; for the other workers they are queued per channel and a
+    single flusher sends everything queued as one `pg_notify` statement,
+    packing a channel's frames into as few notifications as fit in a
+    payload. Receivers skip the batches they sent themselves."""
+
+    def __init__(self, url: str = DATABASE_URL):
+        self.conninfo = (
+            make_url(url)
+            .set(drivername="postgresql")
+            .render_as_string(hide_password=False)
+        )
+        self.worker = uuid.uuid4().hex[:WORKER_ID_LENGTH]
+        # a notification on this channel wakes the listener up so that it
+        # applies pending LISTEN/UNLISTEN commands
+        self.control = f"{BROKER_CHANNEL_PREFIX}_ctl_{self.worker}"
+        self.handler = None
+        self.listen_connection = None
+        self.notify_connection = None
+        self.refcounts = Counter()
+        self.listening = set()
+        self.pending = defaultdict(list)
+        self.wakeup = asyncio.Event()
+        self.partial = {}
+        self.tasks = []
+        self.published = 0
+        self.notifications = 0
+        self.batches = 0
+        self.received = 0
+        self.errors = 0
+
+    async def connect(self):
+        import psycopg
+
+        return await psycopg.AsyncConnection.connect(self.conninfo, autocommit=True)
+
+    async def connect_listener(self):
+        connection = await self.connect()
+        # notifications arriving while LISTEN/UNLISTEN runs are only handed
+        # to notify handlers, not to notifies()
+        connection.add_notify_handler(self.on_notify)
+        return connection
+
+    async def start(self, handler):
+        self.handler = handler
+        # fail early when the database is unreachable
+        self.listen_connection = await self.connect_listener()
+        self.notify_connection = await self.connect()
+        self.tasks = [
+            asyncio.create_task(self.listen()),
+            asyncio.create_task(self.flush()),
+        ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        # what was published since the last flush, e.g. a goodbye frame
+        if self.pending and self.notify_connection is not None:
+            await self.send_pending()
+        for connection in (self.listen_connection, self.notify_connection):
+            if connection is not None:
+                await connection.close()
+        self.handler = None
+
+    def subscribe(self, channel):
+        self.refcounts[channel] += 1
+        if self.refcounts[channel] == 1:
+            self.interrupt()
+
+    def unsubscribe(self, channel):
+        self.refcounts[channel] -= 1
+        if self.refcounts[channel] <= 0:
+            del self.refcounts[channel]
+            self.interrupt()
+
+    def interrupt(self):
+        if not self.pending[self.control]:
+            self.pending[self.control].append("")
+            self.wakeup.set()
+
+    def publish(self, channel, frame):
+        self.published += 1
+        if self.handler is not None:
+            self.handler(channel, frame)
+        self.pending[channel].append(frame)
+        self.wakeup.set()
+
+    def payloads(self, frames) -> Iterator[str]:
+        # <worker><flag><index><frames joined by newlines>, where the flag says
+        # whether the frames continue in the next notification of the channel;
+        # frames are JSON so they never contain a raw newline. The index keeps
+        # two identical chunks from being collapsed into one by NOTIFY
+        data = "\n".join(frames).encode()
+        size = NOTIFY_PAYLOAD_LIMIT - HEADER_LENGTH
+        chunks = list(split_utf8(data, size)) or [""]
+        for index, chunk in enumerate(chunks):
+            flag = "+" if index < len(chunks) - 1 else "."
+            yield f"{self.worker}{flag}{index:04x}{chunk}"
+
+    async def flush(self):
+        while True:
+            await self.wakeup.wait()
+            await asyncio.sleep(BROKER_FLUSH_INTERVAL)
+            self.wakeup.clear()
+            if not await self.send_pending():
+                self.notify_connection = await self.reconnect(
+                    self.notify_connection, self.connect
+                )
+
+    async def send_pending(self) -> bool:
+        """Sends everything queued; on failure the frames go back to the front
+        of the queue for the next attempt."""
+        pending, self.pending = self.pending, defaultdict(list)
+        channels, payloads = [], []
+        for channel, frames in pending.items():
+            for payload in self.payloads(frames):
+                channels.append(channel)
+                payloads.append(payload)
+        try:
+            # one statement and one round trip for the whole batch; the
+            # notifications of a transaction are delivered together and in
+            # order, which the continuation flag relies on
+            await self.notify_connection.execute(
+                "SELECT pg_notify(channel, payload) "
+                "FROM unnest(%s::text[], %s::text[]) AS batch(channel, payload)",
+                (channels, payloads),
+            )
+        except Exception:
+            self.errors += 1
+            logger.exception("Could not publish %d notifications", len(payloads))
+            for channel, frames in pending.items():
+                if channel == self.control:
+                    self.pending[channel] = [""]
+                else:
+                    self.pending[channel][:0] = frames
+            return False
+        self.batches += 1
+        self.notifications += len(payloads)
+        return True
+
+    async def reconnect(self, connection, connect):
+        await connection.close()
+        while True:
+            try:
+                return await connect()
+            except Exception:
+                logger.exception("Could not reconnect the chat broker")
+                await asyncio.sleep(BROKER_RECONNECT_DELAY)
+
+    async def apply_subscriptions(self):
+        from psycopg import sql
+
+        wanted = set(self.refcounts) | {self.control}
+        for command, channels in (
+            ("LISTEN", wanted - self.listening),
+            ("UNLISTEN", self.listening - wanted),
+        ):
+            if channels:
+                await self.listen_connection.execute(
+                    sql.SQL(" ").join(
+                        sql.SQL("{} {};").format(sql.SQL(command), sql.Identifier(c))
+                        for c in channels
+                    )
+                )
+        self.listening = wanted
+
+    async def listen(self):
+        while True:
+            try:
+                if self.listening != set(self.refcounts) | {self.control}:
+                    await self.apply_subscriptions()
+                # stop_after=1 returns once the batch holding the first
+                # notification has been yielded in full, so subscriptions
+                # change between batches and nothing read is dropped
+                async for notify in self.listen_connection.notifies(stop_after=1):
+                    self.on_notify(notify)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors += 1
+                logger.exception("Chat broker listener failed, reconnecting")
+                self.partial.clear()
+                self.listening = set()
+                self.listen_connection = await self.reconnect(
+                    self.listen_connection, self.connect_listener
+                )
+
+    def on_notify(self, notify):
+        # the control channel only wakes the listener up
+        if notify.channel != self.control:
+            self.receive(notify.channel, notify.payload)
+
+    def receive(self, channel, payload):
+        worker, flag = payload[:WORKER_ID_LENGTH], payload[WORKER_ID_LENGTH]
+        data = payload[HEADER_LENGTH:]
+        if worker == self.worker:
+            return
+        key = (worker, channel)
+        if key in self.partial:
+            data = self.partial.pop(key) + data
+        if flag == "+":
+            self.partial[key] = data
+            return
+        for frame in data.split("\n"):
+            self.received += 1
+            self.handler(channel, frame)
+
+    def stats(self):
+        return {
+            "backend": BrokerBackend.postgres,
+            "worker": self.worker,
+            "channels": len(self.refcounts),
+            "published": self.published,
+            "notifications": self.notifications,
+            "batches": self.batches,
+            "received": self.received,
+            "errors": self.errors,
+        }
+
+
+@lru_cache
+def get_broker() -> ChatBrokerInterface:
+    match CHAT_BROKER:
+        case BrokerBackend.memory:
+            return InMemoryBroker()
+        case BrokerBackend.postgres:
+            return PostgresBroker()
@@ -0,0 +1,289 @@
+import csv
+import json
+from enum import Enum
+from pathlib import Path
+from typing import Iterator, Optional
+
+from decouple import config
+from fastapi import HTTPException
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.helpers.helper_func import (
+    get_hash_executor,
+    get_hashed_password,
+    release_connection,
+)
+from app.models.base import City
+from app.models.users import Profile, User
+from app.validations.user_profile_validation import CreateUserValidation
+
+
+IMPORT_CHUNK_SIZE = config("IMPORT_CHUNK_SIZE", default=500, cast=int)
+TEXT_FIELDS = ("username", "phone_number", "password", "first_name", "last_name")
+# columns whose size the imported value has to fit
+SIZED_FIELDS = {
+    "username": User.username,
+    "first_name": Profile.first_name,
+    "last_name": Profile.last_name,
+}
+
+
+class ImportFormat(str, Enum):
+    csv = "csv"
+    jsonl = "jsonl"
+
+    @classmethod
+    def from_filename(cls, filename: Optional[str]) -> "ImportFormat":
+        suffix = Path(filename or "").suffix.lower()
+        if suffix == ".csv":
+            return cls.csv
+        if suffix in (".jsonl", ".ndjson"):
+            return cls.jsonl
+        raise HTTPException(
+            status_code=400, detail="Unknown import format, use csv or jsonl"
+        )
+
+
+def decode_line(number: int, line: bytes) -> str:
+    # decoded line by line, so an invalid byte does not cost the lines before
+    return line.decode("utf-8-sig" if number == 0 else "utf-8")
+
+
+def read_rows(stream, format: ImportFormat) -> Iterator[tuple[dict, Optional[str]]]:
+    """Yields `(row, error)` pairs from a binary stream without reading it
+    whole into memory."""
+    if format == ImportFormat.csv:
+        try:
+            lines = (decode_line(number, line) for number, line in enumerate(stream))
+            for row in csv.DictReader(lines):
+                yield row, None
+        except UnicodeDecodeError:
+            # a CSV record can span lines, nothing after this point is reliable
+            yield {}, "Invalid UTF-8, the rest of the file was not imported"
+        except csv.Error as e:
+            yield {}, f"Invalid CSV, the rest of the file was not imported: {e}"
+        return
+    for number, line in enumerate(stream):
+        try:
+            line = decode_line(number, line)
+        except UnicodeDecodeError:
+            yield {}, "Invalid UTF-8"
+            continue
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield {}, "Invalid JSON line"
+            continue
+        if isinstance(row, dict):
+            yield row, None
+        else:
+            yield {}, "Each line must be a JSON object"
+
+
+def parse_id(value) -> Optional[int]:
+    # ids are JSON integers or strings of digits, not 3.7 or true
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        value = value.strip()
+        if value.isascii() and value.isdigit():
+            return int(value)
+    return None
+
+
+class UserImporter:
+    """Imports users and their profiles in chunked transactions.
+
+    Per chunk the usernames and phone numbers are checked with one set query
+    each, provinces/cities are resolved from a map loaded once per import,
+    passwords are hashed in parallel on the hashing pool and users/profiles
+    are inserted with executemany. Rows that fail are reported, not raised.
+    """
+
+    def __init__(self, db, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.errors = []
+        self.seen_usernames = set()
+        self.seen_phone_numbers = set()
+        self.city_provinces = None
+
+    def run(self, rows) -> dict:
+        self.city_provinces = dict(
+            self.db.execute(select(City.id, City.province_id)).tuples().all()
+        )
+        chunk = []
+        for number, (row, error) in enumerate(rows, start=1):
+            chunk.append((number, row, error))
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+        return {
+            "created": self.created,
+            "failed": len(self.errors),
+            "errors": sorted(self.errors, key=lambda error: error["row"]),
+        }
+
+    def add_error(self, number: int, *errors: str):
+        self.errors.append({"row": number, "errors": list(errors)})
+
+    def validate_row(self, row: dict) -> tuple[dict, list]:
+        # JSON lines may carry numbers or objects where text is expected
+        errors = [
+            f"{field} must be a string"
+            for field in TEXT_FIELDS
+            if not isinstance(row.get(field) or "", str)
+        ]
+        if errors:
+            return {}, errors
+        # the driver refuses NUL in text parameters
+        errors = [
+            f"{field} must not contain NUL characters"
+            for field in TEXT_FIELDS
+            if "\x00" in (row.get(field) or "")
+        ]
+        if errors:
+            return {}, errors
+        data = {
+            "username": (row.get("username") or "").strip(),
+            "phone_number": (row.get("phone_number") or "").strip(),
+            "password": row.get("password") or "",
+            "first_name": row.get("first_name") or None,
+            "last_name": row.get("last_name") or None,
+        }
+        if not data["username"]:
+            errors.append("username is required")
+        for field, column in SIZED_FIELDS.items():
+            if data[field] and len(data[field]) > column.type.length:
+                errors.append(f"{field} is longer than {column.type.length}")
+        for validator, field in [
+            (CreateUserValidation.validate_phone_number, "phone_number"),
+            (CreateUserValidation.validate_is_strong, "password"),
+        ]:
+            try:
+                validator(data[field])
+            except HTTPException as e:
+                errors.append(e.detail)
+        data["province_id"] = parse_id(row.get("province"))
+        data["city_id"] = parse_id(row.get("city"))
+        if data["province_id"] is None or data["city_id"] is None:
+            errors.append("province and city must be ids")
+        elif self.city_provinces.get(data["city_id"]) != data["province_id"]:
+            errors.append("City not found")
+        if data["username"] in self.seen_usernames:
+            errors.append("Duplicate username in import")
+        if data["phone_number"] in self.seen_phone_numbers:
+            errors.append("Duplicate phone_number in import")
+        return data, errors
+
+    def import_chunk(self, chunk):
+        candidates = []
+        for number, row, error in chunk:
+            if error:
+                self.add_error(number, error)
+                continue
+            data, errors = self.validate_row(row)
+            if errors:
+                self.add_error(number, *errors)
+                continue
+            self.seen_usernames.add(data["username"])
+            self.seen_phone_numbers.add(data["phone_number"])
+            candidates.append((number, data))
+        if not candidates:
+            return
+
+        taken_usernames = set(
+            self.db.scalars(
+                select(User.username).where(
+                    User.username.in_([data["username"] for _, data in candidates])
+                )
+            )
+        )
+        taken_phone_numbers = set(
+            self.db.scalars(
+                select(User.phone_number).where(
+                    User.phone_number.in_(
+                        [data["phone_number"] for _, data in candidates]
+                    )
+                )
+            )
+        )
+        valid = []
+        for number, data in candidates:
+            errors = []
+            if data["username"] in taken_usernames:
+                errors.append("A user with username already exists")
+            if data["phone_number"] in taken_phone_numbers:
+                errors.append("A user with phone_number already exists")
+            if errors:
+                self.add_error(number, *errors)
+            else:
+                valid.append((number, data))
+        if not valid:
+            return
+
+        release_connection(self.db)
+        for (_, data), hashed in zip(
+            valid, self.hash_passwords([data["password"] for _, data in valid])
+        ):
+            data["password"] = hashed
+
+        try:
+            self.insert([data for _, data in valid])
+            self.db.commit()
+            self.created += len(valid)
+        except (IntegrityError, DataError):
+            # lost a race with another writer (or a value the database refused),
+            # retry row by row to report it
+            self.db.rollback()
+            self.insert_one_by_one(valid)
+
+    def hash_passwords(self, passwords: list) -> list:
+        executor = get_hash_executor()
+        if executor is None:
+            return [get_hashed_password(password) for password in passwords]
+        return list(executor.map(get_hashed_password, passwords, chunksize=16))
+
+    def insert(self, rows: list):
+        user_ids = self.db.scalars(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            [
+                {
+                    "username": data["username"],
+                    "phone_number": data["phone_number"],
+                    "password": data["password"],
+                }
+                for data in rows
+            ],
+        ).all()
+        self.db.execute(
+            insert(Profile),
+            [
+                {
+                    "user_id": user_id,
+                    "province_id": data["province_id"],
+                    "city_id": data["city_id"],
+                    "first_name": data["first_name"],
+                    "last_name": data["last_name"],
+                }
+                for user_id, data in zip(user_ids, rows)
+            ],
+        )
+
+    def insert_one_by_one(self, valid):
+        for number, data in valid:
+            try:
+                with self.db.begin_nested():
+                    self.insert([data])
+                self.created += 1
+            except IntegrityError:
+                self.add_error(number, "A user with username or phone_number exists")
+            except DataError as e:
+                self.add_error(number, str(e.orig).splitlines()[0])
+        self.db.commit()
@@ -0,0 +1,577 @@
+import asyncio
+import datetime
+import logging
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Optional
+
+from decouple import config
+from fastapi import HTTPException
+from sqlalchemy import (
+    and_,
+    bindparam,
+    case,
+    exists,
+    func,
+    insert,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.helpers.connection_manager import encode_event, manager
+from app.helpers.pagination import decode_token, encode_token
+from app.models.chat import Conversation, Membership, Message
+
+
+logger = logging.getLogger(__name__)
+
+# messages arriving within this many seconds of each other share a commit
+CHAT_COMMIT_WINDOW = config("CHAT_COMMIT_WINDOW", default=0.005, cast=float)
+CHAT_COMMIT_BATCH_SIZE = config("CHAT_COMMIT_BATCH_SIZE", default=500, cast=int)
+CHAT_WRITE_QUEUE_SIZE = config("CHAT_WRITE_QUEUE_SIZE", default=10_000, cast=int)
+# acknowledged delivery positions are written at most this often per worker
+CHAT_ACK_INTERVAL = config("CHAT_ACK_INTERVAL", default=1, cast=float)
+CHAT_CATCHUP_CHUNK = config("CHAT_CATCHUP_CHUNK", default=200, cast=int)
+# beyond this, a reconnecting client pages history instead
+CHAT_CATCHUP_LIMIT = config("CHAT_CATCHUP_LIMIT", default=5000, cast=int)
+# acknowledged positions newer than this many seconds are resent on catch-up
+CHAT_DELIVERY_MARGIN = config("CHAT_DELIVERY_MARGIN", default=10, cast=float)
+# catch-up queries running at once in a worker, whatever the reconnect rate
+CHAT_CATCHUP_CONCURRENCY = config("CHAT_CATCHUP_CONCURRENCY", default=4, cast=int)
+
+MESSAGE_COLUMNS = (
+    Message.id,
+    Message.conversation_id,
+    Message.sender_id,
+    Message.body,
+    Message.client_id,
+    Message.created,
+)
+
+
+def message_item(message) -> dict:
+    # message is a Message or a row of MESSAGE_COLUMNS
+    return {
+        "id": message.id,
+        "conversation_id": message.conversation_id,
+        "sender_id": message.sender_id,
+        "body": message.body,
+        "client_id": message.client_id,
+        "created": message.created,
+    }
+
+
+def membership_exists(conversation_id: int, user_id: int):
+    return select(
+        exists().where(
+            Membership.conversation_id == conversation_id,
+            Membership.user_id == user_id,
+        )
+    )
+
+
+async def is_member(session: AsyncSession, conversation_id: int, user_id: int):
+    return await session.scalar(membership_exists(conversation_id, user_id))
+
+
+membership = Membership.__table__
+
+# executemany statements run in the transaction that stores a batch, with
+# one parameter set per conversation (and per sender) of the batch
+RECORD_ACTIVITY = (
+    update(membership)
+    .where(membership.c.conversation_id == bindparam("b_conversation_id"))
+    .values(
+        # greatest() because batches of other workers may commit out of order
+        last_message_id=func.greatest(
+            membership.c.last_message_id, bindparam("b_message_id")
+        ),
+        last_activity=func.greatest(membership.c.last_activity, bindparam("b_created")),
+        unread_count=membership.c.unread_count + bindparam("b_count"),
+    )
+)
+# sending a message reads everything before it
+RECORD_SENT = (
+    update(membership)
+    .where(
+        membership.c.conversation_id == bindparam("b_conversation_id"),
+        membership.c.user_id == bindparam("b_user_id"),
+    )
+    .values(
+        last_read_message_id=func.greatest(
+            membership.c.last_read_message_id, bindparam("b_message_id")
+        ),
+        unread_count=bindparam("b_unread"),
+    )
+)
+
+
+def inbox_updates(saved) -> tuple[list, list]:
+    """Parameters of RECORD_ACTIVITY and RECORD_SENT for a stored batch."""
+    ids = defaultdict(list)
+    created = {}
+    sent = {}
+    for message in saved:
+        ids[message.conversation_id].append(message.id)
+        created[message.conversation_id] = message.created
+        sent[message.conversation_id, message.sender_id] = message.id
+    for conversation_ids in ids.values():
+        conversation_ids.sort()
+    # memberships are locked in conversation order, so concurrent batches
+    # cannot deadlock on each other
+    activity = [
+        {
+            "b_conversation_id": conversation_id,
+            "b_message_id": ids[conversation_id][-1],
+            "b_created": created[conversation_id],
+            "b_count": len(ids[conversation_id]),
+        }
+        for conversation_id in sorted(ids)
+    ]
+    senders = [
+        {
+            "b_conversation_id": conversation_id,
+            "b_user_id": user_id,
+            "b_message_id": message_id,
+            # what the others sent after the sender's last message
+            "b_unread": len(ids[conversation_id])
+            - bisect_right(ids[conversation_id], message_id),
+        }
+        for (conversation_id, user_id), message_id in sorted(sent.items())
+        if user_id is not None
+    ]
+    return activity, senders
+
+
+def mark_read(conversation_id: int, user_id: int, message_id: int):
+    """Moves the member's read position forward to `message_id` (never back,
+    never past the last message) and recounts what is left unread, which
+    only scans the messages after the new position."""
+    position = func.greatest(
+        func.coalesce(Membership.last_read_message_id, 0),
+        func.least(message_id, func.coalesce(Membership.last_message_id, 0)),
+    )
+    unread = (
+        select(func.count())
+        .select_from(Message)
+        .where(
+            Message.conversation_id == Membership.conversation_id,
+            Message.id > position,
+            Message.sender_id.is_distinct_from(Membership.user_id),
+        )
+        .scalar_subquery()
+    )
+    return (
+        update(Membership)
+        .where(
+            Membership.conversation_id == conversation_id,
+            Membership.user_id == user_id,
+        )
+        .values(
+            last_read_message_id=func.nullif(position, 0),
+            unread_count=case(
+                (position >= func.coalesce(Membership.last_message_id, 0), 0),
+                else_=unread,
+            ),
+        )
+        .returning(
+            Membership.conversation_id,
+            Membership.last_read_message_id,
+            Membership.unread_count,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def record_read(
+    conversation_id: int, user_id: int, message_id: int
+) -> Optional[dict]:
+    """Applies a read receipt, returns None when the user is not a member."""
+    async with AsyncSessionLocal() as session:
+        row = (
+            await session.execute(mark_read(conversation_id, user_id, message_id))
+        ).first()
+        await session.commit()
+    if row is None:
+        return None
+    receipt = row._asdict()
+    # the user's other sockets update their inbox
+    manager.send_to_user(user_id, {"type": "read", **receipt})
+    return receipt
+
+
+INBOX_COLUMNS = (
+    Membership.conversation_id,
+    Conversation.title,
+    Membership.unread_count,
+    Membership.last_read_message_id,
+    Membership.last_activity,
+    Message.id.label("message_id"),
+    Message.sender_id,
+    Message.body,
+    Message.client_id,
+    Message.created,
+)
+
+
+def encode_inbox_cursor(row) -> str:
+    return encode_token(
+        {"id": row.conversation_id, "at": row.last_activity.isoformat()}
+    )
+
+
+def decode_inbox_cursor(token: str) -> tuple[datetime.datetime, int]:
+    position = decode_token(token)
+    try:
+        return (
+            datetime.datetime.fromisoformat(position["at"]),
+            int(position["id"]),
+        )
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def inbox_query(user_id: int, limit: int, after: Optional[str] = None):
+    """A user's conversations, most recently active first, with their last
+    message: one range scan of ix_membership_user_id_last_activity plus a
+    primary key lookup per row, whatever the number of messages."""
+    query = (
+        select(*INBOX_COLUMNS)
+        .select_from(Membership)
+        .join(Conversation, Conversation.id == Membership.conversation_id)
+        .outerjoin(
+            Message,
+            and_(
+                Message.conversation_id == Membership.conversation_id,
+                Message.id == Membership.last_message_id,
+            ),
+        )
+        .filter(Membership.user_id == user_id)
+        .order_by(Membership.last_activity.desc(), Membership.conversation_id.desc())
+    )
+    if after:
+        query = query.filter(
+            tuple_(Membership.last_activity, Membership.conversation_id)
+            < tuple_(*decode_inbox_cursor(after))
+        )
+    # one extra row tells whether there is a next page
+    return query.limit(limit + 1)
+
+
+def inbox_item(row) -> dict:
+    # row is a row of INBOX_COLUMNS
+    return {
+        "conversation_id": row.conversation_id,
+        "title": row.title,
+        "unread_count": row.unread_count,
+        "last_read_message_id": row.last_read_message_id,
+        "last_activity": row.last_activity,
+        "last_message": (
+            {
+                "id": row.message_id,
+                "conversation_id": row.conversation_id,
+                "sender_id": row.sender_id,
+                "body": row.body,
+                "client_id": row.client_id,
+                "created": row.created,
+            }
+            if row.message_id is not None
+            else None
+        ),
+    }
+
+
+class MessageWriter:
+    """Persists messages sent over WebSockets with group commit.
+
+    `submit` only queues the message. A single writer task takes everything
+    that arrives within CHAT_COMMIT_WINDOW of the first message (at most
+    CHAT_COMMIT_BATCH_SIZE), inserts it as one multi-row INSERT and commits
+    once; messages arriving while a commit is in flight form the next batch.
+    The members' inbox rows are updated in the same transaction. Events are
+    published after the commit, carrying the stored id, so a client never
+    sees a message that history or the inbox would not return."""
+
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=CHAT_WRITE_QUEUE_SIZE)
+        self.task = None
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+
+    def submit(self, connection, frame) -> bool:
+        """Queues a MessageFrame sent on `connection`, returns False when the
+        writer is too far behind to accept it."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        try:
+            self.queue.put_nowait((connection, frame))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def stop(self):
+        # lets the writer commit what is already queued
+        if self.task is not None and not self.task.done():
+            await self.queue.put(None)
+            await self.task
+
+    async def run(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            if CHAT_COMMIT_WINDOW:
+                await asyncio.sleep(CHAT_COMMIT_WINDOW)
+            while len(batch) < CHAT_COMMIT_BATCH_SIZE and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is None:
+                    await self.write(batch)
+                    return
+                batch.append(item)
+            await self.write(batch)
+
+    async def write(self, batch):
+        try:
+            saved = await self.insert(batch)
+        except IntegrityError:
+            # e.g. a conversation deleted meanwhile, keep the rest of the batch
+            if len(batch) == 1:
+                return self.reject(batch)
+            for item in batch:
+                await self.write([item])
+            return
+        except SQLAlchemyError:
+            logger.exception("Could not save %d messages", len(batch))
+            return self.reject(batch)
+        self.written += len(saved)
+        self.batches += 1
+        for message in saved:
+            manager.publish(
+                message.conversation_id, {"type": "message", **message_item(message)}
+            )
+
+    async def insert(self, batch):
+        rows = [
+            {
+                "conversation_id": frame.conversation_id,
+                "sender_id": connection.user_id,
+                "body": frame.body,
+                "client_id": frame.client_id,
+            }
+            for connection, frame in batch
+        ]
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                insert(Message).returning(
+                    *MESSAGE_COLUMNS, sort_by_parameter_order=True
+                ),
+                rows,
+            )
+            saved = result.all()
+            activity, senders = inbox_updates(saved)
+            await session.execute(RECORD_ACTIVITY, activity)
+            if senders:
+                await session.execute(RECORD_SENT, senders)
+            await session.commit()
+        return saved
+
+    def reject(self, batch):
+        self.failed += len(batch)
+        for connection, frame in batch:
+            connection.send(
+                encode_event(
+                    {
+                        "type": "error",
+                        "detail": "Message could not be saved",
+                        "client_id": frame.client_id,
+                    }
+                )
+            )
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "failed": self.failed,
+        }
+
+
+writer = MessageWriter()
+
+
+def catchup_query(user_id: int, since: Optional[int], after: int, limit: int):
+    """The next `limit` messages after `after` that the user missed in any
+    of their conversations, oldest first. A conversation is caught up from
+    `since`, or from its membership's delivered or read position, whichever
+    is further; those whose last message is not newer are skipped on the
+    membership row, so only partitions with missed messages are read."""
+    if since is None:
+        start = func.greatest(
+            func.coalesce(Membership.delivered_message_id, 0),
+            func.coalesce(Membership.last_read_message_id, 0),
+        )
+    else:
+        start = since
+    return (
+        select(*MESSAGE_COLUMNS)
+        .join(
+            Membership,
+            and_(
+                Membership.conversation_id == Message.conversation_id,
+                Membership.user_id == user_id,
+                Membership.last_message_id > start,
+            ),
+        )
+        .filter(Message.id > start, Message.id > after)
+        .order_by(Message.id)
+        .limit(limit)
+    )
+
+
+catchup_slots = asyncio.Semaphore(CHAT_CATCHUP_CONCURRENCY)
+
+
+async def catch_up(connection, since: Optional[int] = None):
+    """Sends `connection` the messages its user missed since `since`, or
+    since what each conversation delivered or read last, in chunks of
+    CHAT_CATCHUP_CHUNK. That covers conversations the socket has not
+    joined, whose messages are never sent live.
+
+    A chunk is queried only once the previous one is queued on the socket,
+    so a slow client slows its own catch-up down instead of piling frames
+    up in memory, and the database connection is not held meanwhile. Ends
+    with a "caught_up" event; `complete` is false when CHAT_CATCHUP_LIMIT
+    was reached and the rest has to be paged from history.
+
+    Messages published while catching up, or delivered shortly before the
+    last acknowledgement, may arrive twice; clients skip ids they already
+    have."""
+    user_id = connection.user_id
+    position, sent, complete = 0, 0, True
+    try:
+        while True:
+            limit = min(CHAT_CATCHUP_CHUNK, CHAT_CATCHUP_LIMIT - sent)
+            if limit <= 0:
+                complete = False
+                break
+            async with catchup_slots, AsyncSessionLocal() as session:
+                rows = (
+                    await session.execute(
+                        catchup_query(user_id, since, position, limit)
+                    )
+                ).all()
+            for row in rows:
+                event = encode_event({"type": "message", **message_item(row)})
+                if not await connection.send_wait(event):
+                    return
+            sent += len(rows)
+            if rows:
+                position = rows[-1].id
+            if len(rows) < limit:
+                break
+    except SQLAlchemyError:
+        logger.exception("Could not catch user %d up", user_id)
+        complete = False
+    connection.send(
+        encode_event(
+            {
+                "type": "caught_up",
+                "message_id": position or None,
+                "count": sent,
+                "complete": complete,
+            }
+        )
+    )
+
+
+# message ids are taken before commit, so a batch of another worker can
+# commit below an id that was already delivered and acknowledged. The
+# delivered position only moves to messages older than CHAT_DELIVERY_MARGIN,
+# which any such batch committed long before, and catch-up resends the rest.
+RECORD_DELIVERED = (
+    update(membership)
+    .where(
+        membership.c.conversation_id == bindparam("b_conversation_id"),
+        membership.c.user_id == bindparam("b_user_id"),
+    )
+    .values(
+        # also never past the conversation's newest message
+        delivered_message_id=func.greatest(
+            membership.c.delivered_message_id,
+            select(func.max(Message.id))
+            .where(
+                Message.conversation_id == bindparam("b_conversation_id"),
+                Message.id <= bindparam("b_message_id"),
+                Message.created
+                < func.now() - datetime.timedelta(seconds=CHAT_DELIVERY_MARGIN),
+            )
+            .scalar_subquery(),
+        )
+    )
+)
+
+
+class DeliveryCursors:
+    """Delivery acknowledgements of this worker's clients. Only the highest
+    id per membership is kept, and all of them are written in one
+    executemany every CHAT_ACK_INTERVAL, so acknowledging every message
+    costs no write each."""
+
+    def __init__(self):
+        self.pending = {}
+        self.task = None
+        self.written = 0
+
+    def ack(self, conversation_id: int, user_id: int, message_id: int):
+        key = conversation_id, user_id
+        if message_id > self.pending.get(key, 0):
+            self.pending[key] = message_id
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(CHAT_ACK_INTERVAL)
+            await self.flush()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        # memberships are locked in conversation order, as by the writer, so
+        # concurrent transactions cannot deadlock on each other
+        parameters = [
+            {
+                "b_conversation_id": conversation_id,
+                "b_user_id": user_id,
+                "b_message_id": message_id,
+            }
+            for (conversation_id, user_id), message_id in sorted(pending.items())
+        ]
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(RECORD_DELIVERED, parameters)
+                await session.commit()
+        except SQLAlchemyError:
+            logger.exception("Could not save %d delivery positions", len(pending))
+            return
+        self.written += len(pending)
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {"pending": len(self.pending), "written": self.written}
+
+
+cursors = DeliveryCursors()
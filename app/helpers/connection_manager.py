@@ -0,0 +1,284 @@
+import asyncio
+import time
+from collections import defaultdict
+from enum import Enum
+from typing import Optional
+
+import orjson
+from decouple import config
+from fastapi import WebSocket
+from starlette.websockets import WebSocketDisconnect, WebSocketState
+
+from app.helpers.broker import conversation_channel, get_broker, user_channel
+
+
+class SlowConsumerPolicy(str, Enum):
+    # what happens when a connection's send queue is full
+    drop = "drop"
+    disconnect = "disconnect"
+
+
+CHAT_MAX_CONNECTIONS = config("CHAT_MAX_CONNECTIONS", default=50_000, cast=int)
+CHAT_SEND_QUEUE_SIZE = config("CHAT_SEND_QUEUE_SIZE", default=256, cast=int)
+CHAT_SLOW_CONSUMER = config(
+    "CHAT_SLOW_CONSUMER", default="disconnect", cast=SlowConsumerPolicy
+)
+CHAT_HEARTBEAT_INTERVAL = config("CHAT_HEARTBEAT_INTERVAL", default=25, cast=float)
+CHAT_IDLE_TIMEOUT = config("CHAT_IDLE_TIMEOUT", default=75, cast=float)
+CHAT_SEND_TIMEOUT = config("CHAT_SEND_TIMEOUT", default=10, cast=float)
+
+# close codes, see RFC 6455 7.4
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_GOING_AWAY = 1001
+
+_PING = orjson.dumps({"type": "ping"}).decode()
+
+
+def encode_event(event: dict) -> str:
+    return orjson.dumps(event).decode()
+
+
+class Connection:
+    """One WebSocket. Outgoing frames go through a bounded queue drained by
+    its own writer task, so a slow client never blocks a fan-out."""
+
+    __slots__ = (
+        "websocket",
+        "user_id",
+        "queue",
+        "conversations",
+        "last_seen",
+        "writer",
+        "closing",
+    )
+
+    def __init__(self, websocket: WebSocket, user_id: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=CHAT_SEND_QUEUE_SIZE)
+        self.conversations = set()
+        self.last_seen = time.monotonic()
+        self.writer = None
+        self.closing = False
+
+    async def write_loop(self):
+        try:
+            while True:
+                frame = await self.queue.get()
+                await asyncio.wait_for(
+                    self.websocket.send_text(frame), timeout=CHAT_SEND_TIMEOUT
+                )
+        except (WebSocketDisconnect, RuntimeError, OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            await self.close(CLOSE_GOING_AWAY)
+
+    def send(self, frame: str) -> bool:
+        if self.closing:
+            return False
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            if CHAT_SLOW_CONSUMER == SlowConsumerPolicy.disconnect:
+                self.abort(CLOSE_TRY_AGAIN_LATER)
+            return False
+
+    async def send_wait(self, frame: str) -> bool:
+        """Like send, but waits for room in the queue instead of applying the
+        slow consumer policy, for bulk sends paced by the client."""
+        if self.closing:
+            return False
+        try:
+            await asyncio.wait_for(self.queue.put(frame), timeout=CHAT_SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+        return not self.closing
+
+    def abort(self, code: int):
+        # called from synchronous fan-out code, the close itself is async
+        if not self.closing:
+            self.closing = True
+            asyncio.get_running_loop().create_task(self.close(code))
+
+    async def close(self, code: int = CLOSE_GOING_AWAY):
+        self.closing = True
+        if self.writer is not None and self.writer is not asyncio.current_task():
+            self.writer.cancel()
+        if self.websocket.application_state == WebSocketState.CONNECTED:
+            try:
+                await self.websocket.close(code)
+            except (RuntimeError, OSError):
+                pass
+
+
+class ConnectionManager:
+    """Connections of this worker by user and by conversation.
+
+    Events are published through the broker, which hands them back to
+    `deliver` in every worker holding sockets for the channel, this one
+    included. A worker subscribes to a channel when its first local socket
+    needs it and unsubscribes when the last one goes away.
+
+    Delivery is a synchronous loop of `put_nowait` calls, so fanning out to
+    a conversation costs the same whatever the clients are doing. A single
+    sweeper task sends heartbeats and evicts idle connections instead of one
+    timer per socket."""
+
+    def __init__(self, broker=None):
+        self.broker = broker or get_broker()
+        self.users = defaultdict(set)
+        self.conversations = defaultdict(set)
+        # broker channel -> the set in users or conversations it delivers to
+        self.channels = {}
+        # broker channel -> callback, for channels read by the server itself
+        self.callbacks = {}
+        self.count = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.rejected = 0
+        self.starting = None
+        self.sweeper = None
+
+    def is_full(self) -> bool:
+        return self.count >= CHAT_MAX_CONNECTIONS
+
+    async def start(self):
+        # the broker needs the running loop, so it starts with the first socket
+        if self.starting is None or (
+            self.starting.done()
+            and (self.starting.cancelled() or self.starting.exception())
+        ):
+            self.starting = asyncio.ensure_future(self.broker.start(self.deliver))
+        await asyncio.shield(self.starting)
+
+    async def shutdown(self):
+        for connections in list(self.users.values()):
+            for connection in list(connections):
+                await self.disconnect(connection)
+        if self.sweeper is not None:
+            self.sweeper.cancel()
+        if self.starting is not None and self.starting.done():
+            await self.broker.stop()
+        self.starting = None
+
+    def add(self, index, key, channel, connection):
+        connections = index[key]
+        if not connections:
+            self.channels[channel] = connections
+            self.broker.subscribe(channel)
+        connections.add(connection)
+
+    def remove(self, index, key, channel, connection) -> bool:
+        connections = index.get(key)
+        if connections is None or connection not in connections:
+            return False
+        connections.discard(connection)
+        if not connections:
+            del index[key]
+            del self.channels[channel]
+            self.broker.unsubscribe(channel)
+        return True
+
+    async def connect(self, websocket: WebSocket, user_id: int) -> Optional[Connection]:
+        if self.is_full():
+            self.rejected += 1
+            await websocket.close(CLOSE_TRY_AGAIN_LATER)
+            return None
+        await self.start()
+        await websocket.accept()
+        connection = Connection(websocket, user_id)
+        connection.writer = asyncio.create_task(connection.write_loop())
+        self.add(self.users, user_id, user_channel(user_id), connection)
+        self.count += 1
+        if self.sweeper is None or self.sweeper.done():
+            self.sweeper = asyncio.create_task(self.sweep())
+        return connection
+
+    async def disconnect(self, connection: Connection):
+        for conversation_id in list(connection.conversations):
+            self.leave(connection, conversation_id)
+        user_id = connection.user_id
+        if self.remove(self.users, user_id, user_channel(user_id), connection):
+            self.count -= 1
+        await connection.close()
+
+    def join(self, connection: Connection, conversation_id: int):
+        # messages published by other workers before their LISTEN is active
+        # are not seen by this socket
+        connection.conversations.add(conversation_id)
+        self.add(
+            self.conversations,
+            conversation_id,
+            conversation_channel(conversation_id),
+            connection,
+        )
+
+    def leave(self, connection: Connection, conversation_id: int):
+        connection.conversations.discard(conversation_id)
+        self.remove(
+            self.conversations,
+            conversation_id,
+            conversation_channel(conversation_id),
+            connection,
+        )
+
+    def listen(self, channel: str, callback):
+        """Hands the frames published on `channel` to `callback(frame)`."""
+        if channel not in self.callbacks:
+            self.callbacks[channel] = callback
+            self.broker.subscribe(channel)
+
+    def deliver(self, channel: str, frame: str) -> int:
+        """Queues `frame` on every local connection of `channel`, returns how
+        many accepted it."""
+        callback = self.callbacks.get(channel)
+        if callback is not None:
+            callback(frame)
+            return 0
+        connections = self.channels.get(channel)
+        if not connections:
+            return 0
+        delivered = sum(connection.send(frame) for connection in list(connections))
+        self.dropped += len(connections) - delivered
+        return delivered
+
+    def publish(self, conversation_id: int, event: dict):
+        # events are encoded once per publish, not once per recipient or worker
+        self.broker.publish(conversation_channel(conversation_id), encode_event(event))
+
+    def send_to_user(self, user_id: int, event: dict):
+        self.broker.publish(user_channel(user_id), encode_event(event))
+
+    async def sweep(self):
+        while self.count:
+            await asyncio.sleep(CHAT_HEARTBEAT_INTERVAL)
+            now = time.monotonic()
+            for connections in list(self.users.values()):
+                for connection in list(connections):
+                    idle = now - connection.last_seen
+                    if idle >= CHAT_IDLE_TIMEOUT:
+                        self.evicted += 1
+                        connection.abort(CLOSE_GOING_AWAY)
+                    elif idle >= CHAT_HEARTBEAT_INTERVAL:
+                        connection.send(_PING)
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.count,
+            "users": len(self.users),
+            "conversations": len(self.conversations),
+            "queued": sum(
+                connection.queue.qsize()
+                for connections in self.users.values()
+                for connection in connections
+            ),
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+            "rejected": self.rejected,
+            "broker": self.broker.stats(),
+        }
+
+
+manager = ConnectionManager()
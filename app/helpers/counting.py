@@ -0,0 +1,84 @@
+from enum import Enum
+
+from decouple import config
+from sqlalchemy import Select, text
+from sqlalchemy.sql.util import find_tables
+
+from app.helpers.cache import TTLCache
+from app.helpers.helper_func import count_query
+from app.helpers.invalidation import on_tables_written
+
+
+class CountMode(str, Enum):
+    exact = "exact"
+    estimate = "estimate"
+    cached = "cached"
+    none = "none"
+
+
+DEFAULT_COUNT_MODE = CountMode(config("COUNT_MODE", default="exact"))
+
+count_cache = TTLCache(
+    maxsize=config("COUNT_CACHE_SIZE", default=1024, cast=int),
+    ttl=config("COUNT_CACHE_TTL", default=60, cast=float),
+)
+
+
+def _query_tables(query: Select) -> frozenset:
+    # ORM joins (join(Profile.city)) are only resolved in the final FROM list
+    clauses = [query, *query.get_final_froms()]
+    return frozenset(table.name for clause in clauses for table in find_tables(clause))
+
+
+def _count_cache_key(db, query: Select):
+    compiled = query.compile(dialect=db.get_bind().dialect)
+    tables = _query_tables(query)
+    return tables, str(compiled), tuple(sorted(compiled.params.items()))
+
+
+@on_tables_written
+def invalidate_counts(tables: set):
+    count_cache.delete_where(lambda key: key[0] & tables)
+
+
+def estimate_count(db, query: Select) -> int:
+    if query.whereclause is None:
+        # unfiltered: read the row estimate maintained by ANALYZE/autovacuum
+        table = query.column_descriptions[0]["entity"].__table__
+        estimate = db.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:t)"),
+            {"t": f'"{table.name}"'},
+        )
+        if estimate is not None and estimate >= 0:
+            return estimate
+    # filtered (or never analyzed): ask the planner how many rows it expects
+    connection = db.connection()
+    compiled = query.order_by(None).compile(dialect=connection.dialect)
+    plan = connection.exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+    ).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_total(db, query: Select, mode: CountMode = DEFAULT_COUNT_MODE):
+    """Returns the total for a list query according to `mode`: the exact
+    COUNT(*), a planner estimate, an exact count cached per filter signature
+    (dropped when one of the queried tables is written), or None."""
+    if mode == CountMode.none:
+        return None
+    if mode == CountMode.estimate:
+        return estimate_count(db, query)
+    if mode == CountMode.cached:
+        key = _count_cache_key(db, query)
+        total = count_cache.get(key)
+        if total is None:
+            # not stored if a write invalidated the cache while counting
+            generation = count_cache.generation
+            total = db.scalar(count_query(query))
+            count_cache.set(key, total, generation=generation)
+        return total
+    return db.scalar(count_query(query))
+
+
+async def count_total_async(db, query: Select, mode: CountMode = DEFAULT_COUNT_MODE):
+    return await db.run_sync(count_total, query, mode)
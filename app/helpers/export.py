@@ -0,0 +1,145 @@
+import csv
+import io
+import zlib
+from enum import Enum
+from typing import Iterator, Optional
+
+import orjson
+from decouple import config
+from fastapi import Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.database import SessionLocal
+from app.helpers.filter import DEFAULT_SEARCH_MODE, ProfileFilter, SearchMode
+from app.models.base import City, Province
+from app.models.users import Profile, User
+
+
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", default=2000, cast=int)
+
+EXPORT_COLUMNS = (
+    Profile.id,
+    User.username,
+    User.phone_number,
+    Profile.first_name,
+    Profile.last_name,
+    Province.id.label("province_id"),
+    Province.name.label("province_name"),
+    City.id.label("city_id"),
+    City.name.label("city_name"),
+    User.is_active,
+    User.is_staff,
+    Profile.image,
+    User.created,
+)
+FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+    @property
+    def media_type(self) -> str:
+        if self == ExportFormat.csv:
+            return "text/csv; charset=utf-8"
+        return "application/x-ndjson"
+
+
+def export_filters(
+    province: Optional[int] = None,
+    city: Optional[int] = None,
+    username: Optional[str] = None,
+    phone_number: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    is_staff: Optional[bool] = None,
+    search: SearchMode = Query(
+        DEFAULT_SEARCH_MODE,
+        description="How text filters match: contains, prefix or exact",
+    ),
+) -> dict:
+    """The export's query parameters as ProfileFilter arguments, shared by
+    the sync and async routes."""
+    return {
+        "username": username,
+        "phone_number": phone_number,
+        "province": province,
+        "city": city,
+        "is_active": is_active,
+        "is_staff": is_staff,
+        "search_mode": search,
+    }
+
+
+def export_chunks(filters: dict, format: ExportFormat) -> Iterator[bytes]:
+    """Yields the profiles matching `filters` (ProfileFilter arguments), one
+    encoded chunk per EXPORT_CHUNK_SIZE rows.
+
+    Rows come from a server side cursor, so memory stays constant whatever
+    the size of the export. The session is owned by the generator because
+    the request's session is closed before a streaming body is sent."""
+    query = ProfileFilter().filter(columns=EXPORT_COLUMNS, **filters)
+    with SessionLocal() as session:
+        result = session.execute(
+            query.execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        ).tuples()
+        if format == ExportFormat.csv:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(FIELDS)
+            for rows in result.partitions():
+                writer.writerows(rows)
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue().encode()
+        else:
+            for rows in result.partitions():
+                yield b"".join(
+                    orjson.dumps(dict(zip(FIELDS, row))) + b"\n" for row in rows
+                )
+
+
+def gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip: listed, or covered by
+    "*", with a q-value above zero (RFC 9110 12.5.3)."""
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+def export_response(
+    request: Request, filters: dict, format: ExportFormat
+) -> StreamingResponse:
+    chunks = export_chunks(filters, format)
+    headers = {
+        "Content-Disposition": f'attachment; filename="profiles.{format.value}"',
+        "Vary": "Accept-Encoding",
+    }
+    if accepts_gzip(request.headers.get("accept-encoding", "")):
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=format.media_type, headers=headers)
@@ -1,43 +1,80 @@
-from sqlalchemy.orm import Session
+from enum import Enum
 
+from decouple import config
+from sqlalchemy import Select, select
+
+from app.helpers.image_variants import variant_urls
 from app.models.base import City, Province
 from typing import Optional
 
 from app.models.users import Profile, User
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import contains_eager, joinedload
 
 
-class ProvinceFilter:
-    def __init__(self, db: Session):
-        self.db = db
+class SearchMode(str, Enum):
+    # contains/prefix are served by the pg_trgm GIN indexes, exact by the btree
+    # indexes on the columns
+    contains = "contains"
+    prefix = "prefix"
+    exact = "exact"
+
+
+DEFAULT_SEARCH_MODE = SearchMode(config("SEARCH_MODE", default="contains"))
+
 
-    def filter(self, name: Optional[str] = None):
-        query = self.db.query(Province).order_by(Province.id.desc())
+def search(column, value: str, mode: SearchMode = DEFAULT_SEARCH_MODE):
+    if mode == SearchMode.exact:
+        return column == value
+    pattern = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    if mode == SearchMode.prefix:
+        return column.ilike(f"{pattern}%", escape="\\")
+    return column.ilike(f"%{pattern}%", escape="\\")
+
+
+# Filters build plain `select()` statements, so the same query runs on a sync
+# `Session` (`db.scalars(query)`) or an `AsyncSession` (`await db.scalars(query)`).
+class ProvinceFilter:
+    def filter(
+        self, name: Optional[str] = None, search_mode: SearchMode = DEFAULT_SEARCH_MODE
+    ) -> Select:
+        query = select(Province).order_by(Province.id.desc())
         if name:
-            query = query.filter(Province.name.ilike(f"%{name}%"))
+            query = query.filter(search(Province.name, name, search_mode))
         return query
 
 
 class CityFilter:
-    def __init__(self, db: Session):
-        self.db = db
-
-    def filter(self, name: Optional[str] = None, province_id: Optional[int] = None):
-        query = (
-            self.db.query(City)
-            .options(joinedload(City.province))
-            .order_by(City.id.desc())
-        )
+    def filter(
+        self,
+        name: Optional[str] = None,
+        province_id: Optional[int] = None,
+        search_mode: SearchMode = DEFAULT_SEARCH_MODE,
+    ) -> Select:
+        query = select(City).options(joinedload(City.province)).order_by(City.id.desc())
         if name:
-            query = query.filter(City.name.ilike(f"%{name}%"))
+            query = query.filter(search(City.name, name, search_mode))
         if province_id:
             query = query.filter(City.province_id == province_id)
         return query
 
 
 class ProfileFilter:
-    def __init__(self, db: Session):
-        self.db = db
+    # the columns users_list returns; with `lean=True` the filter selects just
+    # these as plain rows instead of hydrating Profile/User/City/Province, and
+    # `columns` selects any other projection the same way
+    LIST_COLUMNS = (
+        Profile.id,
+        User.id.label("user_id"),
+        User.username,
+        User.phone_number,
+        City.id.label("city_id"),
+        City.name.label("city_name"),
+        Province.id.label("province_id"),
+        Province.name.label("province_name"),
+        User.is_active,
+        User.is_staff,
+        Profile.image_variants,
+    )
 
     def filter(
         self,
@@ -47,23 +84,30 @@ class ProfileFilter:
         city: Optional[int] = None,
         is_active: Optional[int] = None,
         is_staff: Optional[int] = None,
-    ):
-        query = (
-            self.db.query(Profile)
-            .join(User)
-            .join(Province)
-            .join(City)
-            .options(
-                joinedload(Profile.user),
-                joinedload(Profile.city),
-                joinedload(Profile.province),
+        search_mode: SearchMode = DEFAULT_SEARCH_MODE,
+        lean: bool = False,
+        columns: Optional[tuple] = None,
+    ) -> Select:
+        if lean or columns:
+            query = select(*(columns or self.LIST_COLUMNS)).select_from(Profile)
+        else:
+            # the relationships are filled from the joins below instead of
+            # being joined a second time by joinedload
+            query = select(Profile).options(
+                contains_eager(Profile.user),
+                contains_eager(Profile.city),
+                contains_eager(Profile.province),
             )
+        query = (
+            query.join(Profile.user)
+            .join(Profile.province)
+            .join(Profile.city)
             .order_by(Profile.id.desc())
         )
         if username:
-            query = query.filter(User.username.ilike(f"%{username}%"))
+            query = query.filter(search(User.username, username, search_mode))
         if phone_number:
-            query = query.filter(User.phone_number.ilike(f"%{phone_number}%"))
+            query = query.filter(search(User.phone_number, phone_number, search_mode))
         if province:
             query = query.filter(Province.id == province)
         if city:
@@ -74,3 +118,18 @@ class ProfileFilter:
             query = query.filter(User.is_staff == is_staff)
 
         return query
+
+
+def profile_list_item(row) -> dict:
+    # row is a ProfileFilter(lean=True) row
+    return {
+        "id": row.id,
+        "user_id": row.user_id,
+        "username": row.username,
+        "phone_number": row.phone_number,
+        "city": {"id": row.city_id, "name": row.city_name},
+        "province": {"id": row.province_id, "name": row.province_name},
+        "is_active": row.is_active,
+        "is_staff": row.is_staff,
+        "image_variants": variant_urls(row),
+    }
@@ -1,9 +1,15 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from decouple import config
+from fastapi.concurrency import run_in_threadpool
 from fastapi.exceptions import HTTPException
 from passlib.context import CryptContext
-import uuid
-from ..config import BASE_DIR
-from pathlib import Path
-import shutil
+from sqlalchemy import Select, func, select
 
 
 def get_or_404(db, model, id):
@@ -13,7 +19,34 @@ def get_or_404(db, model, id):
     return obj
 
 
-password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+async def get_or_404_async(db, model, id, options=()):
+    obj = await db.get(model, id, options=options)
+    if not obj:
+        raise HTTPException(status_code=404, detail=f"{model.__name__} not found")
+    return obj
+
+
+def count_query(query: Select) -> Select:
+    return select(func.count()).select_from(query.order_by(None).subquery())
+
+
+def release_connection(db):
+    # ends a read-only transaction so the pooled connection is not held during
+    # slow work; with expire_on_commit=False loaded objects stay usable
+    if not (db.new or db.dirty or db.deleted):
+        db.commit()
+
+
+# hashes made with a different cost are flagged by deprecated="auto" and
+# rehashed on the next successful login
+BCRYPT_ROUNDS = config("BCRYPT_ROUNDS", default=12, cast=int)
+PASSWORD_HASH_WORKERS = config(
+    "PASSWORD_HASH_WORKERS", default=os.cpu_count() or 1, cast=int
+)
+
+password_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS
+)
 
 
 def get_hashed_password(password: str) -> str:
@@ -24,10 +57,40 @@ def verify_password(password: str, hashed_pass: str) -> bool:
     return password_context.verify(password, hashed_pass)
 
 
-def create_image_media(folder_name, image):
-    object_folder = BASE_DIR / "media" / f"{folder_name}"
-    object_folder.mkdir(parents=True, exist_ok=True)
-    unique_filename = f"{uuid.uuid4()}{Path(image.filename).suffix}"
-    file_location = object_folder / unique_filename
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(image.file, buffer)
+def verify_and_update_password(
+    password: str, hashed_pass: str
+) -> tuple[bool, Optional[str]]:
+    return password_context.verify_and_update(password, hashed_pass)
+
+
+_hash_executor = None
+_hash_executor_lock = threading.Lock()
+
+
+def get_hash_executor() -> Optional[ProcessPoolExecutor]:
+    """bcrypt holds the GIL for its whole run, so hashing is done in a fixed
+    size process pool (PASSWORD_HASH_WORKERS, 0 hashes in-process)."""
+    global _hash_executor
+    if PASSWORD_HASH_WORKERS <= 0:
+        return None
+    with _hash_executor_lock:
+        if _hash_executor is None:
+            _hash_executor = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return _hash_executor
+
+
+def run_hasher(func, *args):
+    executor = get_hash_executor()
+    if executor is None:
+        return func(*args)
+    return executor.submit(func, *args).result()
+
+
+async def run_hasher_async(func, *args):
+    executor = get_hash_executor()
+    if executor is None:
+        return await run_in_threadpool(func, *args)
+    return await asyncio.wrap_future(executor.submit(func, *args))
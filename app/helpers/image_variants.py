@@ -0,0 +1,98 @@
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PurePosixPath
+from typing import Optional
+
+from decouple import config
+from PIL import Image, ImageOps
+from sqlalchemy import update
+
+from app.database import SessionLocal
+from app.helpers.media_store import media_key, media_path, media_url
+from app.helpers.storage import get_storage
+from app.models.users import Profile
+
+
+logger = logging.getLogger(__name__)
+
+# name -> longest side in pixels; every variant is a WebP next to the original
+IMAGE_VARIANTS = {"thumb": 128, "medium": 512}
+IMAGE_VARIANT_QUALITY = config("IMAGE_VARIANT_QUALITY", default=80, cast=int)
+IMAGE_VARIANT_WORKERS = config("IMAGE_VARIANT_WORKERS", default=2, cast=int)
+
+
+def variant_urls(profile) -> Optional[dict]:
+    if not profile.image_variants:
+        return None
+    return {name: media_url(path) for name, path in profile.image_variants.items()}
+
+
+def render_variants(image: str) -> dict:
+    """Writes the resized WebP variants of the media path `image` to the media
+    storage and returns their media paths by variant name. Runs in the image
+    worker processes."""
+    storage = get_storage()
+    key = PurePosixPath(media_key(image))
+    # originals are capped by MAX_IMAGE_SIZE; Pillow needs a seekable file
+    with storage.open(str(key)) as stream:
+        source = io.BytesIO(stream.read())
+    variants = {}
+    with Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in original.getbands() or "transparency" in original.info
+            original = original.convert("RGBA" if has_alpha else "RGB")
+        for name, size in IMAGE_VARIANTS.items():
+            target = str(key.with_name(f"{key.name.split('.', 1)[0]}.{name}.webp"))
+            resized = original.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, "WEBP", quality=IMAGE_VARIANT_QUALITY, method=4)
+            buffer.seek(0)
+            storage.put(target, buffer, "image/webp")
+            variants[name] = media_path(target)
+    return variants
+
+
+_image_executor = None
+_image_executor_lock = threading.Lock()
+
+
+def get_image_executor() -> Optional[ProcessPoolExecutor]:
+    """Decoding and resizing are CPU bound, so they run in their own process
+    pool (IMAGE_VARIANT_WORKERS, 0 renders in the calling thread) and never
+    compete with the hashing pool or the request threads."""
+    global _image_executor
+    if IMAGE_VARIANT_WORKERS <= 0:
+        return None
+    with _image_executor_lock:
+        if _image_executor is None:
+            _image_executor = ProcessPoolExecutor(
+                max_workers=IMAGE_VARIANT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return _image_executor
+
+
+def generate_variants(profile_id: int, image: str):
+    """Background task run after a profile image is committed. The variants
+    are only stored if the profile still points at the same original."""
+    executor = get_image_executor()
+    try:
+        if executor is None:
+            variants = render_variants(image)
+        else:
+            variants = executor.submit(render_variants, image).result()
+    except Exception:
+        logger.exception("Could not render variants of %s", image)
+        return
+    with SessionLocal() as db:
+        db.execute(
+            update(Profile)
+            .where(Profile.id == profile_id, Profile.image == image)
+            .values(image_variants=variants)
+        )
+        db.commit()
@@ -0,0 +1,33 @@
+import argparse
+
+from app.helpers.bulk_import import (
+    IMPORT_CHUNK_SIZE,
+    ImportFormat,
+    UserImporter,
+    read_rows,
+)
+from app.database import SessionLocal
+
+
+def import_users(path, format=None, chunk_size=IMPORT_CHUNK_SIZE):
+    format = ImportFormat(format) if format else ImportFormat.from_filename(path)
+    with open(path, "rb") as stream, SessionLocal() as session:
+        return UserImporter(session, chunk_size=chunk_size).run(
+            read_rows(stream, format)
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Bulk import users from a CSV or JSONL file with the columns "
+        "username, phone_number, password, province, city, first_name, last_name"
+    )
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=[format.value for format in ImportFormat])
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    report = import_users(args.path, format=args.format, chunk_size=args.chunk_size)
+    for error in report["errors"]:
+        print(f"row {error['row']}: {'; '.join(error['errors'])}")
+    print(f"created {report['created']}, failed {report['failed']}")
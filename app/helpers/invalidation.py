@@ -0,0 +1,56 @@
+from itertools import chain
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+
+# Callbacks receive the set of table names written by a committed transaction.
+# Invalidation is per process; cross-worker staleness is bounded by the TTL of
+# whatever cache is listening.
+_listeners = []
+
+
+def on_tables_written(func):
+    _listeners.append(func)
+    return func
+
+
+def _written_tables(session) -> set:
+    return session.info.setdefault("written_tables", set())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session, flush_context):
+    tables = _written_tables(session)
+    # objects only touched through a backref collection are "dirty" without
+    # any UPDATE being issued for their table
+    dirty = (
+        obj
+        for obj in session.dirty
+        if session.is_modified(obj, include_collections=False)
+    )
+    for obj in chain(session.new, dirty, session.deleted):
+        tables.add(inspect(obj).mapper.local_table.name)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_executed_tables(orm_execute_state):
+    # bulk insert/update/delete statements bypass the flush
+    state = orm_execute_state
+    if state.is_insert or state.is_update or state.is_delete:
+        mapper = state.bind_mapper
+        if mapper is not None:
+            _written_tables(state.session).add(mapper.local_table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_written_tables(session):
+    tables = session.info.pop("written_tables", None)
+    if tables:
+        for listener in _listeners:
+            listener(tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written_tables(session):
+    session.info.pop("written_tables", None)
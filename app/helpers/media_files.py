@@ -0,0 +1,64 @@
+from enum import Enum
+from pathlib import Path
+
+from decouple import config
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from app.helpers.storage import MEDIA_CACHE_CONTROL
+
+
+class AccelMode(str, Enum):
+    off = "off"
+    nginx = "nginx"
+    sendfile = "sendfile"
+
+
+MEDIA_ACCEL_MODE = config("MEDIA_ACCEL_MODE", default="off", cast=AccelMode)
+# internal location of the media root on the proxy, for MEDIA_ACCEL_MODE=nginx
+MEDIA_ACCEL_PREFIX = config("MEDIA_ACCEL_PREFIX", default="/protected-media")
+
+
+class MediaFiles(StaticFiles):
+    """StaticFiles for the media root. Every stored file has a name unique to
+    its content (see media_store), so responses are cacheable forever and the
+    name doubles as a strong ETag that survives mtime changes and copies.
+
+    Range requests are answered by FileResponse. With MEDIA_ACCEL_MODE set,
+    only headers are sent and the proxy streams the file (nginx
+    X-Accel-Redirect or Apache/lighttpd X-Sendfile)."""
+
+    async def get_response(self, path: str, scope):
+        # dot files and directories hold temporary files, never media
+        if any(part.startswith(".") for part in Path(path).parts):
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        path = Path(full_path)
+        headers = {
+            "cache-control": MEDIA_CACHE_CONTROL,
+            "etag": f'"{path.name}"',
+        }
+        response = FileResponse(
+            full_path, status_code=status_code, headers=headers, stat_result=stat_result
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        if MEDIA_ACCEL_MODE == AccelMode.off:
+            return response
+
+        headers.update(
+            {
+                "content-type": response.headers["content-type"],
+                "last-modified": response.headers["last-modified"],
+            }
+        )
+        if MEDIA_ACCEL_MODE == AccelMode.nginx:
+            relative = path.relative_to(Path(self.directory).resolve()).as_posix()
+            headers["x-accel-redirect"] = f"{MEDIA_ACCEL_PREFIX}/{relative}"
+        else:
+            headers["x-sendfile"] = str(path)
+        return Response(status_code=status_code, headers=headers)
@@ -0,0 +1,33 @@
+import argparse
+
+from app.database import SessionLocal
+from app.helpers.media_store import GC_BATCH_SIZE, GC_MIN_AGE, collect_garbage
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Delete media files that are not referenced by any profile"
+    )
+    parser.add_argument("--batch-size", type=int, default=GC_BATCH_SIZE)
+    parser.add_argument(
+        "--min-age",
+        type=int,
+        default=GC_MIN_AGE,
+        help="seconds a file must be untouched before it can be deleted",
+    )
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    with SessionLocal() as session:
+        report = collect_garbage(
+            session,
+            batch_size=args.batch_size,
+            min_age=args.min_age,
+            dry_run=args.dry_run,
+        )
+    print(
+        f"checked {report['checked']} blobs, "
+        f"{'would delete' if args.dry_run else 'deleted'} {report['deleted']} files "
+        f"({report['freed_bytes']} bytes), "
+        f"expired {report['expired_uploads']} unfinished uploads"
+    )
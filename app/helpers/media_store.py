@@ -0,0 +1,149 @@
+import datetime
+import time
+from itertools import groupby
+from pathlib import Path, PurePosixPath
+from typing import Iterator, Optional
+
+from decouple import config
+from sqlalchemy import func, select, union_all
+
+from app.helpers.helper_func import release_connection
+from app.helpers.storage import (
+    MEDIA_ROOT,
+    MEDIA_URL_PREFIX,
+    StoredFile,
+    get_storage,
+)
+from app.models.chat import Attachment
+from app.models.users import Profile
+
+
+# Blobs are stored by the SHA-256 of their content under a two level fan-out,
+# e.g. 3a/7f/3a7f...e1.png, with their image variants next to them as
+# <digest>.<variant>.webp. Profile.image keeps the key as a /media/<key> path.
+# Identical uploads share one blob; nothing is deleted on update, unreferenced
+# blobs are removed by `collect_garbage`.
+# staging sits next to the media root, not in it, so /media never serves a
+# file still being written; same parent so publishing stays a rename
+STAGING_DIR = Path(
+    config(
+        "MEDIA_STAGING_DIR",
+        default=str(MEDIA_ROOT.parent / f"{MEDIA_ROOT.name}_staging"),
+    )
+)
+GC_BATCH_SIZE = config("MEDIA_GC_BATCH_SIZE", default=500, cast=int)
+# blobs and staged files younger than this are never collected, which covers
+# uploads whose row is not committed yet and blobs re-used by a new upload
+GC_MIN_AGE = config("MEDIA_GC_MIN_AGE", default=3600, cast=int)
+# staged files of chunked uploads, see attachments; they are kept, and can be
+# resumed, until untouched for UPLOAD_TTL seconds
+UPLOAD_PREFIX = "upload-"
+UPLOAD_TTL = config("MEDIA_UPLOAD_TTL", default=24 * 3600, cast=int)
+
+
+def blob_key(digest: str, extension: str) -> str:
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+
+def media_path(key: str) -> str:
+    return f"{MEDIA_URL_PREFIX}/{key}"
+
+
+def media_key(media_path: str) -> str:
+    return media_path.removeprefix(MEDIA_URL_PREFIX).lstrip("/")
+
+
+def media_url(media_path: Optional[str]) -> Optional[str]:
+    return get_storage().url(media_key(media_path)) if media_path else None
+
+
+def _group_key(stored: StoredFile):
+    key = PurePosixPath(stored.key)
+    return key.parent, key.name.split(".", 1)[0]
+
+
+def _blob_groups() -> Iterator[list[StoredFile]]:
+    # groups an original with its variants, legacy <phone>/<uuid>.<ext> files
+    # included; backends list keys in order so a group is always contiguous
+    for _, files in groupby(get_storage().list(), key=_group_key):
+        yield list(files)
+
+
+def _is_old(stored: Optional[StoredFile], now: float, min_age: int) -> bool:
+    return stored is not None and now - stored.modified >= min_age
+
+
+def expire_uploads(db, dry_run: bool = False) -> int:
+    """Deletes upload sessions untouched for UPLOAD_TTL, their staged files
+    go with the staging sweep of collect_garbage."""
+    expired = db.query(Attachment).filter(
+        Attachment.path.is_(None),
+        Attachment.updated < func.now() - datetime.timedelta(seconds=UPLOAD_TTL),
+    )
+    count = expired.count() if dry_run else expired.delete(synchronize_session=False)
+    db.commit()
+    return count
+
+
+def collect_garbage(
+    db,
+    batch_size: int = GC_BATCH_SIZE,
+    min_age: int = GC_MIN_AGE,
+    dry_run: bool = False,
+) -> dict:
+    """Deletes stored media that no Profile.image or Attachment.path points
+    at, checking `batch_size` blobs per query, plus abandoned staged uploads
+    and upload sessions."""
+    storage = get_storage()
+    now = time.time()
+    report = {"checked": 0, "deleted": 0, "freed_bytes": 0, "expired_uploads": 0}
+
+    def delete(files: list[StoredFile]):
+        # a blob that was just re-used by an upload has had its mtime bumped,
+        # so the whole group is re-checked right before removing anything
+        files = [storage.stat(stored.key) for stored in files]
+        if not all(_is_old(stored, now, min_age) for stored in files):
+            return
+        for stored in files:
+            if not dry_run:
+                storage.delete(stored.key)
+            report["deleted"] += 1
+            report["freed_bytes"] += stored.size
+
+    def sweep(batch):
+        paths = [media_path(stored.key) for files in batch for stored in files]
+        referenced = set(
+            db.scalars(
+                union_all(
+                    select(Profile.image).where(Profile.image.in_(paths)),
+                    select(Attachment.path).where(Attachment.path.in_(paths)),
+                )
+            )
+        )
+        release_connection(db)
+        for files in batch:
+            report["checked"] += 1
+            if not referenced.intersection(media_path(s.key) for s in files):
+                delete(files)
+
+    batch = []
+    for group in _blob_groups():
+        batch.append(group)
+        if len(batch) >= batch_size:
+            sweep(batch)
+            batch = []
+    if batch:
+        sweep(batch)
+
+    report["expired_uploads"] = expire_uploads(db, dry_run)
+
+    if STAGING_DIR.is_dir():
+        for path in STAGING_DIR.iterdir():
+            stat_result = path.stat()
+            max_age = UPLOAD_TTL if path.name.startswith(UPLOAD_PREFIX) else min_age
+            if now - stat_result.st_mtime >= max_age:
+                if not dry_run:
+                    path.unlink(missing_ok=True)
+                report["deleted"] += 1
+                report["freed_bytes"] += stat_result.st_size
+    return report
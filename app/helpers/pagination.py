@@ -0,0 +1,96 @@
+import base64
+import binascii
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Select
+
+
+def encode_token(position: dict) -> str:
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        position = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(position, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
+
+def encode_cursor(id: int) -> str:
+    return encode_token({"id": id})
+
+
+def decode_cursor(token: str) -> int:
+    value = decode_token(token).get("id")
+    if not isinstance(value, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value
+
+
+class KeysetPage:
+    """Pages a filter query ordered by `column.desc()`.
+
+    With `after`/`before` cursors the page is located with `column < id` /
+    `column > id`, so the cost does not grow with the depth of the page.
+    Without a cursor it falls back to the old skip/limit behaviour. In both
+    modes one extra row is fetched to know whether another page exists.
+    """
+
+    def __init__(
+        self,
+        column,
+        skip: int = 0,
+        limit: int = 10,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+    ):
+        if after and before:
+            raise HTTPException(
+                status_code=400, detail="Use either after or before, not both"
+            )
+        self.column = column
+        self.skip = skip
+        self.limit = limit
+        self.after = decode_cursor(after) if after else None
+        self.before = decode_cursor(before) if before else None
+
+    @property
+    def is_cursor(self) -> bool:
+        return self.after is not None or self.before is not None
+
+    def apply(self, query: Select) -> Select:
+        if self.before is not None:
+            query = (
+                query.filter(self.column > self.before)
+                .order_by(None)
+                .order_by(self.column.asc())
+            )
+        elif self.after is not None:
+            query = query.filter(self.column < self.after)
+        else:
+            query = query.offset(self.skip)
+        return query.limit(self.limit + 1)
+
+    def paginate(self, rows) -> tuple[list, dict]:
+        rows = list(rows)
+        has_more = len(rows) > self.limit
+        rows = rows[: self.limit]
+        if self.before is not None:
+            rows.reverse()
+            has_next, has_previous = bool(rows), has_more
+        elif self.after is not None:
+            has_next, has_previous = has_more, bool(rows)
+        else:
+            has_next, has_previous = has_more, bool(rows) and self.skip > 0
+        cursors = {
+            "next_cursor": encode_cursor(rows[-1].id) if has_next else None,
+            "previous_cursor": encode_cursor(rows[0].id) if has_previous else None,
+        }
+        return rows, cursors
@@ -7,3 +7,9 @@ def is_admin(user: dict = Depends(JWTBearer())):
     if user.get("is_staff") and user.get("is_active"):
         return True
     raise HTTPException(status_code=403, detail="Only admin can access this")
+
+
+def is_active_user(user: dict = Depends(JWTBearer())) -> dict:
+    if user.get("is_active"):
+        return user
+    raise HTTPException(status_code=403, detail="Inactive user")
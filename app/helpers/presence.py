@@ -0,0 +1,218 @@
+import asyncio
+import time
+import uuid
+from collections import defaultdict
+
+import orjson
+from decouple import config
+
+from app.helpers.broker import service_channel
+from app.helpers.connection_manager import Connection, encode_event, manager
+
+
+PRESENCE_SHARDS = config("PRESENCE_SHARDS", default=64, cast=int)
+# presence changes and typing users of a conversation are sent at most once
+# per interval
+PRESENCE_INTERVAL = config("PRESENCE_INTERVAL", default=1, cast=float)
+# each worker sends its full set of online users this often, a worker not
+# heard from for three intervals is considered gone
+PRESENCE_SYNC_INTERVAL = config("PRESENCE_SYNC_INTERVAL", default=30, cast=float)
+PRESENCE_MAX_LOOKUP = config("PRESENCE_MAX_LOOKUP", default=500, cast=int)
+
+PRESENCE_CHANNEL = service_channel("presence")
+
+
+class PresenceMap:
+    """user id -> {worker id: connection count}, in shards by user id so that
+    snapshots and expiry can go through it a shard at a time."""
+
+    def __init__(self, shards: int = PRESENCE_SHARDS):
+        self.shards = [{} for _ in range(shards)]
+
+    def shard(self, user_id: int) -> dict:
+        return self.shards[user_id % len(self.shards)]
+
+    def add(self, user_id: int, worker: str) -> int:
+        """Counts one more connection, returns the worker's count."""
+        workers = self.shard(user_id).setdefault(user_id, {})
+        workers[worker] = workers.get(worker, 0) + 1
+        return workers[worker]
+
+    def remove(self, user_id: int, worker: str, all: bool = False) -> int:
+        """Counts one connection less (or none at all), returns the worker's
+        count."""
+        shard = self.shard(user_id)
+        workers = shard.get(user_id)
+        if workers is None or worker not in workers:
+            return 0
+        count = 0 if all else workers[worker] - 1
+        if count:
+            workers[worker] = count
+            return count
+        del workers[worker]
+        if not workers:
+            del shard[user_id]
+        return 0
+
+    def is_online(self, user_id: int) -> bool:
+        return user_id in self.shard(user_id)
+
+    def online(self, user_ids) -> list:
+        return [user_id for user_id in user_ids if self.is_online(user_id)]
+
+    def __len__(self):
+        return sum(map(len, self.shards))
+
+
+class Presence:
+    """Who is online and who is typing. Never stored anywhere.
+
+    Each worker counts its own sockets per user and tells the other workers,
+    through the broker, which users came online or went offline on it. They
+    keep that in the same map, so any worker answers for all of them.
+
+    Changes are collected and sent once per PRESENCE_INTERVAL: one frame for
+    the other workers, and at most one event per conversation with its
+    presence changes and typing users of the interval."""
+
+    def __init__(self):
+        self.worker = uuid.uuid4().hex[:12]
+        self.map = PresenceMap()
+        # user -> online, this worker's changes not yet sent to the others
+        self.changes = {}
+        # user -> conversations joined on this worker's sockets of the user,
+        # told when the user goes offline even if that socket is gone by then
+        self.joined_by = defaultdict(set)
+        # conversation -> users whose presence changed / who typed
+        self.changed = defaultdict(set)
+        self.typing = defaultdict(set)
+        # other worker -> users online on it, and when it was last heard from
+        self.remote = {}
+        self.heard = {}
+        self.sync_due = True
+        self.task = None
+        self.broadcasts = 0
+
+    async def start(self):
+        await manager.start()
+        manager.listen(PRESENCE_CHANNEL, self.receive)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        # lets the other workers forget this one's users straight away
+        self.send({"worker": self.worker, "snapshot": []})
+
+    def connected(self, connection: Connection):
+        if self.map.add(connection.user_id, self.worker) == 1:
+            self.changes[connection.user_id] = True
+
+    def disconnected(self, connection: Connection):
+        if self.map.remove(connection.user_id, self.worker) == 0:
+            self.changes[connection.user_id] = False
+            for conversation_id in self.joined_by.pop(connection.user_id, ()):
+                self.changed[conversation_id].add(connection.user_id)
+
+    def joined(self, connection: Connection, conversation_id: int):
+        self.joined_by[connection.user_id].add(conversation_id)
+        self.changed[conversation_id].add(connection.user_id)
+
+    def typed(self, connection: Connection, conversation_id: int):
+        self.typing[conversation_id].add(connection.user_id)
+
+    def online(self, user_ids) -> list:
+        return self.map.online(user_ids)
+
+    def send(self, message: dict):
+        manager.broker.publish(PRESENCE_CHANNEL, encode_event(message))
+
+    def receive(self, frame: str):
+        message = orjson.loads(frame)
+        worker = message["worker"]
+        if worker == self.worker:
+            return
+        if worker not in self.heard:
+            # a new worker, it learns about this one from a snapshot
+            self.sync_due = True
+        self.heard[worker] = time.monotonic()
+        users = self.remote.setdefault(worker, set())
+        if "snapshot" in message:
+            snapshot = set(message["snapshot"])
+            online, offline = snapshot - users, users - snapshot
+        else:
+            online, offline = message["online"], message["offline"]
+        for user_id in online:
+            if user_id not in users:
+                users.add(user_id)
+                self.map.add(user_id, worker)
+        for user_id in offline:
+            if user_id in users:
+                users.discard(user_id)
+                self.map.remove(user_id, worker, all=True)
+
+    def flush(self):
+        if self.changes:
+            changes, self.changes = self.changes, {}
+            self.send(
+                {
+                    "worker": self.worker,
+                    "online": [user_id for user_id, on in changes.items() if on],
+                    "offline": [user_id for user_id, on in changes.items() if not on],
+                }
+            )
+        changed, self.changed = self.changed, defaultdict(set)
+        typing, self.typing = self.typing, defaultdict(set)
+        for conversation_id in changed.keys() | typing.keys():
+            users = changed.get(conversation_id, ())
+            self.broadcasts += 1
+            manager.publish(
+                conversation_id,
+                {
+                    "type": "presence",
+                    "conversation_id": conversation_id,
+                    "online": self.map.online(users),
+                    "offline": [
+                        user_id for user_id in users if not self.map.is_online(user_id)
+                    ],
+                    "typing": list(typing.get(conversation_id, ())),
+                },
+            )
+
+    async def sync(self):
+        snapshot = []
+        for shard in self.map.shards:
+            snapshot.extend(
+                user_id for user_id, workers in shard.items() if self.worker in workers
+            )
+            await asyncio.sleep(0)
+        self.send({"worker": self.worker, "snapshot": snapshot})
+        expired = time.monotonic() - 3 * PRESENCE_SYNC_INTERVAL
+        for worker, heard in list(self.heard.items()):
+            if heard < expired:
+                for user_id in self.remote.pop(worker, ()):
+                    self.map.remove(user_id, worker, all=True)
+                del self.heard[worker]
+                await asyncio.sleep(0)
+
+    async def run(self):
+        synced = time.monotonic()
+        while True:
+            await asyncio.sleep(PRESENCE_INTERVAL)
+            self.flush()
+            if self.sync_due or time.monotonic() - synced >= PRESENCE_SYNC_INTERVAL:
+                self.sync_due = False
+                synced = time.monotonic()
+                await self.sync()
+
+    def stats(self) -> dict:
+        return {
+            "online": len(self.map),
+            "workers": len(self.remote) + 1,
+            "broadcasts": self.broadcasts,
+        }
+
+
+presence = Presence()
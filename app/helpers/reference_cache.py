@@ -0,0 +1,144 @@
+from contextlib import contextmanager
+from typing import Optional
+
+from decouple import config
+from sqlalchemy.orm import Session, joinedload
+
+from app.helpers.cache import TTLCache
+from app.helpers.counting import CountMode, count_total
+from app.helpers.filter import CityFilter, ProvinceFilter, SearchMode
+from app.helpers.invalidation import on_tables_written
+from app.helpers.pagination import KeysetPage
+from app.helpers.responses import dump_validated
+from app.models.base import City, Province
+from app.schemas.base import PaginatedCityResponse, PaginatedProvinceResponse
+
+
+# Province and City are small and read-mostly, so details, list pages and the
+# lookups done by BaseValidation are served from memory. Cached instances are
+# detached; use `db.merge(obj, load=False)` before attaching them to a session.
+# List pages are cached as validated, serialized JSON.
+REFERENCE_TABLES = {"province", "city"}
+
+reference_cache = TTLCache(
+    maxsize=config("REFERENCE_CACHE_SIZE", default=4096, cast=int),
+    ttl=config("REFERENCE_CACHE_TTL", default=300, cast=float),
+)
+
+
+@on_tables_written
+def invalidate_reference_data(tables: set):
+    if tables & REFERENCE_TABLES:
+        reference_cache.clear()
+
+
+@contextmanager
+def _loader_session(db):
+    # reuse the request's connection, and hand out instances that are not
+    # attached to the request session
+    session = Session(bind=db.connection(), expire_on_commit=False)
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _cached(db, key, loader):
+    value = reference_cache.get(key)
+    if value is None:
+        # not stored if a write invalidated the cache while loading
+        generation = reference_cache.generation
+        with _loader_session(db) as session:
+            value = loader(session)
+        if value is not None:
+            reference_cache.set(key, value, generation=generation)
+    return value
+
+
+def get_province(db, province_id: int) -> Optional[Province]:
+    return _cached(
+        db, ("province", province_id), lambda s: s.get(Province, province_id)
+    )
+
+
+def get_city(db, city_id: int) -> Optional[City]:
+    return _cached(
+        db,
+        ("city", city_id),
+        lambda s: s.get(City, city_id, options=[joinedload(City.province)]),
+    )
+
+
+def province_page_json(
+    db,
+    name: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 10,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    count: CountMode = CountMode.exact,
+    search_mode: SearchMode = SearchMode.contains,
+) -> bytes:
+    def load(session):
+        query = ProvinceFilter().filter(name=name, search_mode=search_mode)
+        total = count_total(session, query, count)
+        page = KeysetPage(
+            Province.id, skip=skip, limit=limit, after=after, before=before
+        )
+        provinces, cursors = page.paginate(session.scalars(page.apply(query)).all())
+        return dump_validated(
+            PaginatedProvinceResponse,
+            {
+                "total": total,
+                "skip": skip,
+                "limit": limit,
+                "provinces": provinces,
+                **cursors,
+            },
+        )
+
+    key = ("province_list", name, skip, limit, after, before, count, search_mode)
+    return _cached(db, key, load)
+
+
+def city_page_json(
+    db,
+    name: Optional[str] = None,
+    province_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 10,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    count: CountMode = CountMode.exact,
+    search_mode: SearchMode = SearchMode.contains,
+) -> bytes:
+    def load(session):
+        query = CityFilter().filter(
+            name=name, province_id=province_id, search_mode=search_mode
+        )
+        total = count_total(session, query, count)
+        page = KeysetPage(City.id, skip=skip, limit=limit, after=after, before=before)
+        cities, cursors = page.paginate(session.scalars(page.apply(query)).all())
+        return dump_validated(
+            PaginatedCityResponse,
+            {
+                "total": total,
+                "skip": skip,
+                "limit": limit,
+                "cities": cities,
+                **cursors,
+            },
+        )
+
+    key = (
+        "city_list",
+        name,
+        province_id,
+        skip,
+        limit,
+        after,
+        before,
+        count,
+        search_mode,
+    )
+    return _cached(db, key, load)
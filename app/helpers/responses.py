@@ -0,0 +1,29 @@
+from decouple import config
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from starlette.responses import Response
+
+
+# hand-built responses are checked against their schema before being sent;
+# turn this off in production once the schemas and the code agree
+VALIDATE_RESPONSES = config("VALIDATE_RESPONSES", default=True, cast=bool)
+
+
+class PreparedJSONResponse(Response):
+    """Sends bytes that are already serialized JSON as they are."""
+
+    media_type = "application/json"
+
+
+def dump_validated(model: type[BaseModel], data) -> bytes:
+    """Validates `data` (objects or dicts) against `model` once and returns it
+    serialized, for responses that are cached as JSON."""
+    return model.model_validate(data, from_attributes=True).model_dump_json().encode()
+
+
+def json_response(model: type[BaseModel], content: dict) -> ORJSONResponse:
+    """Returns a hand-built dict of plain values straight to orjson, skipping
+    FastAPI's response_model validation and jsonable_encoder pass."""
+    if VALIDATE_RESPONSES:
+        model.model_validate(content)
+    return ORJSONResponse(content)
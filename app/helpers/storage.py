@@ -0,0 +1,235 @@
+import os
+import shutil
+import uuid
+from enum import Enum
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from decouple import config
+
+from app.config import BASE_DIR
+from app.helpers.cache import TTLCache
+from app.interface.media_storage_interface import MediaStorageInterface
+
+
+class StorageBackend(str, Enum):
+    local = "local"
+    s3 = "s3"
+
+
+MEDIA_STORAGE = config("MEDIA_STORAGE", default="local", cast=StorageBackend)
+MEDIA_ROOT = Path(config("MEDIA_ROOT", default=str(BASE_DIR / "media")))
+MEDIA_URL_PREFIX = "/media"
+MEDIA_HOST = config("HOST", default="http://127.0.0.1:8000")
+MEDIA_CACHE_CONTROL = "public, max-age={}, immutable".format(
+    config("MEDIA_CACHE_MAX_AGE", default=365 * 24 * 3600, cast=int)
+)
+
+S3_BUCKET = config("S3_BUCKET", default="")
+S3_ENDPOINT_URL = config("S3_ENDPOINT_URL", default=None)
+S3_REGION = config("S3_REGION", default=None)
+# set when the bucket is public or behind a CDN; otherwise URLs are presigned
+S3_PUBLIC_URL = config("S3_PUBLIC_URL", default="")
+S3_URL_EXPIRES = config("S3_URL_EXPIRES", default=3600, cast=int)
+# presigned URLs are reused for half their lifetime, so an image keeps one
+# URL that clients can cache instead of a new signature per response
+S3_URL_CACHE_SIZE = config("S3_URL_CACHE_SIZE", default=10_000, cast=int)
+S3_MULTIPART_THRESHOLD = config(
+    "S3_MULTIPART_THRESHOLD", default=8 * 1024 * 1024, cast=int
+)
+S3_MULTIPART_CHUNK_SIZE = config(
+    "S3_MULTIPART_CHUNK_SIZE", default=8 * 1024 * 1024, cast=int
+)
+
+
+class StoredFile(NamedTuple):
+    key: str
+    size: int
+    modified: float
+
+
+class LocalStorage(MediaStorageInterface):
+    """Objects are files under `root`, served by the /media mount."""
+
+    def __init__(self, root: Path = MEDIA_ROOT, base_url: str = MEDIA_HOST):
+        self.root = root
+        self.base_url = base_url
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def put(self, key, stream, content_type=None):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f".{uuid.uuid4()}.part")
+        try:
+            with open(temp, "wb") as buffer:
+                shutil.copyfileobj(stream, buffer)
+            os.replace(temp, path)
+        except BaseException:
+            temp.unlink(missing_ok=True)
+            raise
+
+    def put_file(self, key, path, content_type=None):
+        target = self.path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, target)
+
+    def open(self, key):
+        return open(self.path(key), "rb")
+
+    def delete(self, key):
+        path = self.path(key)
+        path.unlink(missing_ok=True)
+        for parent in path.parents:
+            if parent == self.root:
+                break
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+
+    def stat(self, key):
+        try:
+            stat_result = self.path(key).stat()
+        except FileNotFoundError:
+            return None
+        return StoredFile(key, stat_result.st_size, stat_result.st_mtime)
+
+    def touch(self, key):
+        os.utime(self.path(key))
+
+    def url(self, key):
+        return f"{self.base_url}{MEDIA_URL_PREFIX}/{key}"
+
+    def list(self):
+        # keys of a directory come together and in order, as in an S3 listing;
+        # media_store relies on that to group an original with its variants
+        for directory, dirnames, filenames in os.walk(self.root):
+            # staging and temporary files are not objects
+            dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+            for filename in sorted(filenames):
+                if filename.startswith("."):
+                    continue
+                path = Path(directory, filename)
+                stat_result = path.stat()
+                yield StoredFile(
+                    path.relative_to(self.root).as_posix(),
+                    stat_result.st_size,
+                    stat_result.st_mtime,
+                )
+
+
+class S3Storage(MediaStorageInterface):
+    """Objects live in an S3 compatible bucket (AWS, MinIO, ...). Uploads above
+    S3_MULTIPART_THRESHOLD are streamed as multipart uploads, and clients get
+    presigned or public URLs so image bytes never pass through the API."""
+
+    def __init__(
+        self,
+        bucket: str = S3_BUCKET,
+        endpoint_url: Optional[str] = S3_ENDPOINT_URL,
+        region: Optional[str] = S3_REGION,
+        public_url: str = S3_PUBLIC_URL,
+        url_expires: int = S3_URL_EXPIRES,
+    ):
+        # optional dependency, only needed with MEDIA_STORAGE=s3
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+
+        self.bucket = bucket
+        self.public_url = public_url.rstrip("/")
+        self.url_expires = url_expires
+        self.urls = TTLCache(maxsize=S3_URL_CACHE_SIZE, ttl=url_expires / 2)
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=S3_MULTIPART_CHUNK_SIZE,
+        )
+
+    def extra_args(self, content_type):
+        extra_args = {"CacheControl": MEDIA_CACHE_CONTROL}
+        if content_type:
+            extra_args["ContentType"] = content_type
+        return extra_args
+
+    def put(self, key, stream, content_type=None):
+        self.client.upload_fileobj(
+            stream,
+            self.bucket,
+            key,
+            ExtraArgs=self.extra_args(content_type),
+            Config=self.transfer_config,
+        )
+
+    def put_file(self, key, path, content_type=None):
+        self.client.upload_file(
+            str(path),
+            self.bucket,
+            key,
+            ExtraArgs=self.extra_args(content_type),
+            Config=self.transfer_config,
+        )
+        os.remove(path)
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        self.urls.delete(key)
+
+    def stat(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return StoredFile(key, head["ContentLength"], head["LastModified"].timestamp())
+
+    def touch(self, key):
+        # an in-place copy is the only way to bump LastModified, it does not
+        # transfer the object's bytes
+        head = self.client.head_object(Bucket=self.bucket, Key=key)
+        self.client.copy_object(
+            Bucket=self.bucket,
+            Key=key,
+            CopySource={"Bucket": self.bucket, "Key": key},
+            MetadataDirective="REPLACE",
+            Metadata=head.get("Metadata", {}),
+            **self.extra_args(head.get("ContentType")),
+        )
+
+    def url(self, key):
+        if self.public_url:
+            return f"{self.public_url}/{key}"
+        url = self.urls.get(key)
+        if url is None:
+            url = self.client.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": self.bucket, "Key": key},
+                ExpiresIn=self.url_expires,
+            )
+            self.urls.set(key, url)
+        return url
+
+    def list(self):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket):
+            for item in page.get("Contents", []):
+                yield StoredFile(
+                    item["Key"], item["Size"], item["LastModified"].timestamp()
+                )
+
+
+@lru_cache
+def get_storage() -> MediaStorageInterface:
+    match MEDIA_STORAGE:
+        case StorageBackend.local:
+            return LocalStorage()
+        case StorageBackend.s3:
+            return S3Storage()
@@ -0,0 +1,105 @@
+import hashlib
+import mimetypes
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from decouple import config
+from fastapi import HTTPException, UploadFile
+
+from app.helpers.media_store import STAGING_DIR, blob_key
+from app.helpers.storage import get_storage
+
+
+MAX_IMAGE_SIZE = config("MAX_IMAGE_SIZE", default=5 * 1024 * 1024, cast=int)
+UPLOAD_CHUNK_SIZE = config("UPLOAD_CHUNK_SIZE", default=64 * 1024, cast=int)
+
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+]
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+class StagedUpload:
+    """An upload written to the local staging directory. `publish` hands it to
+    the media storage under its content addressed key, `discard` removes it."""
+
+    def __init__(self, temp_path: Path, key: str, content_type: str):
+        self.temp_path = temp_path
+        self.key = key
+        self.content_type = content_type
+
+    def publish(self):
+        storage = get_storage()
+        if storage.stat(self.key) is not None:
+            # same content is already stored; bump its mtime so a running
+            # garbage collection treats it as fresh
+            storage.touch(self.key)
+            self.discard()
+        else:
+            storage.put_file(self.key, self.temp_path, self.content_type)
+
+    def discard(self):
+        self.temp_path.unlink(missing_ok=True)
+
+
+def stage_image(upload: UploadFile, max_size: int = MAX_IMAGE_SIZE) -> StagedUpload:
+    """Copies `upload` into the staging directory in chunks, checking the real
+    image type from its first bytes, hashing the content on the way and
+    stopping as soon as `max_size` is exceeded."""
+    if upload.size is not None and upload.size > max_size:
+        raise HTTPException(status_code=413, detail="Image is too large.")
+    upload.file.seek(0)
+    chunk = upload.file.read(UPLOAD_CHUNK_SIZE)
+    extension = sniff_image_type(chunk)
+    if extension is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid image file type. Allowed formats are jpg, jpeg, png, gif, bmp.",
+        )
+    STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    temp_path = STAGING_DIR / f"{uuid.uuid4()}.part"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as buffer:
+            while chunk:
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=413, detail="Image is too large.")
+                digest.update(chunk)
+                buffer.write(chunk)
+                chunk = upload.file.read(UPLOAD_CHUNK_SIZE)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return StagedUpload(
+        temp_path,
+        blob_key(digest.hexdigest(), extension),
+        mimetypes.types_map[f".{extension}"],
+    )
+
+
+@contextmanager
+def publish_on_success(staged: Optional[StagedUpload]):
+    """Publishes the staged upload if the block (the DB commit) succeeds and
+    discards it otherwise, so no row points at a missing file."""
+    try:
+        yield
+    except BaseException:
+        if staged:
+            staged.discard()
+        raise
+    if staged:
+        staged.publish()
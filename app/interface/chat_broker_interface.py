@@ -0,0 +1,47 @@
+from abc import ABC, abstractmethod
+
+
+class ChatBrokerInterface(ABC):
+    @abstractmethod
+    async def start(self, handler):
+        """
+        Starts receiving. `handler(channel, frame)` is called for every frame
+        published on a subscribed channel, by this process or any other.
+        """
+        pass
+
+    @abstractmethod
+    async def stop(self):
+        """
+        Stops receiving and releases the broker's connections.
+        """
+        pass
+
+    @abstractmethod
+    def subscribe(self, channel):
+        """
+        Adds a reference to `channel`, the first one subscribes this process.
+        """
+        pass
+
+    @abstractmethod
+    def unsubscribe(self, channel):
+        """
+        Drops a reference to `channel`, the last one unsubscribes this process.
+        """
+        pass
+
+    @abstractmethod
+    def publish(self, channel, frame):
+        """
+        Sends the encoded `frame` to every process subscribed to `channel`.
+        Does not block: frames are queued and sent in batches.
+        """
+        pass
+
+    @abstractmethod
+    def stats(self):
+        """
+        Returns a dict of counters for /internal/chat.
+        """
+        pass
@@ -0,0 +1,61 @@
+from abc import ABC, abstractmethod
+
+
+class MediaStorageInterface(ABC):
+    @abstractmethod
+    def put(self, key, stream, content_type=None):
+        """
+        Stores the content of the binary file object `stream` under `key`,
+        replacing any existing object atomically.
+        """
+        pass
+
+    @abstractmethod
+    def put_file(self, key, path, content_type=None):
+        """
+        Stores the local file at `path` under `key` and takes ownership of it:
+        the local file is moved or removed afterwards.
+        """
+        pass
+
+    @abstractmethod
+    def open(self, key):
+        """
+        Returns a readable binary file object with the content of `key`.
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        """
+        Deletes `key`, a missing key is not an error.
+        """
+        pass
+
+    @abstractmethod
+    def stat(self, key):
+        """
+        Returns a StoredFile for `key`, or None if it does not exist.
+        """
+        pass
+
+    @abstractmethod
+    def touch(self, key):
+        """
+        Sets the modification time of `key` to now without changing it.
+        """
+        pass
+
+    @abstractmethod
+    def url(self, key):
+        """
+        Returns a URL clients can fetch `key` from without going through the API.
+        """
+        pass
+
+    @abstractmethod
+    def list(self):
+        """
+        Yields a StoredFile for every stored object.
+        """
+        pass
@@ -1,14 +1,46 @@
 import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from .database import DB_ASYNC_MODE
+from .routers.async_base import async_base_router
+from .routers.async_users import async_user_router
 from .routers.base import base_router
+from .routers.chat import chat_router
+from .routers.internal import internal_router
 
 from .routers.users import user_router
-from fastapi.staticfiles import StaticFiles
-from .config import BASE_DIR
+from .helpers.chat_store import cursors, writer
+from .helpers.connection_manager import manager
+from .helpers.presence import presence
+from .helpers.media_files import MediaFiles
+from .helpers.storage import MEDIA_ROOT, MEDIA_STORAGE, StorageBackend
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await presence.start()
+    yield
+    # commits the queued chat messages and delivery cursors, then closes the
+    # sockets of this worker and the chat broker's connections
+    await writer.stop()
+    await cursors.stop()
+    await presence.stop()
+    await manager.shutdown()
+
 
-media_dir = BASE_DIR / "media"
-os.makedirs(media_dir, exist_ok=True)
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+if DB_ASYNC_MODE:
+    # registered first so they take precedence over the matching sync routes;
+    # anything without an async variant falls through to the sync routers
+    app.include_router(async_user_router, prefix="/users", tags=["users"])
+    app.include_router(async_base_router, prefix="/base", tags=["base"])
 app.include_router(user_router, prefix="/users", tags=["users"])
 app.include_router(base_router, prefix="/base", tags=["base"])
-app.mount("/media", StaticFiles(directory=media_dir), name="media")
+app.include_router(chat_router, prefix="/chat", tags=["chat"])
+app.include_router(internal_router, prefix="/internal", tags=["internal"])
+if MEDIA_STORAGE == StorageBackend.local:
+    # object store URLs point at the bucket, nothing is served from here
+    os.makedirs(MEDIA_ROOT, exist_ok=True)
+    app.mount("/media", MediaFiles(directory=MEDIA_ROOT), name="media")
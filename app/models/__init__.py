@@ -1,2 +1,3 @@
 from .users import User, Profile
 from .base import Province, City
+from .chat import Attachment, Conversation, Membership, Message
@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, String, UniqueConstraint, Column, Integer
+from sqlalchemy import ForeignKey, Index, String, UniqueConstraint, Column, Integer
 from app.database import Base
 from sqlalchemy.orm import relationship
 
@@ -9,6 +9,14 @@ class Province(Base):
     name = Column(String(50), index=True, unique=True)
     cities = relationship("City", back_populates="province", cascade="all, delete")
     profiles = relationship("Profile", back_populates="province", cascade="all, delete")
+    __table_args__ = (
+        Index(
+            "ix_province_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+    )
 
 
 class City(Base):
@@ -19,5 +27,11 @@ class City(Base):
     province = relationship("Province", back_populates="cities")
     __table_args__ = (
         UniqueConstraint("name", "province_id", name="_name_province_id"),
+        Index(
+            "ix_city_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
     )
     profiles = relationship("Profile", back_populates="city")
@@ -0,0 +1,110 @@
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    PrimaryKeyConstraint,
+    String,
+    Text,
+    UniqueConstraint,
+    func,
+)
+from app.database import Base
+from sqlalchemy.orm import relationship
+
+
+class Conversation(Base):
+    __tablename__ = "conversation"
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String(100), nullable=True)
+    created_by = Column(Integer, ForeignKey("user.id", ondelete="SET NULL"))
+    created = Column(DateTime, default=func.now())
+    memberships = relationship(
+        "Membership", back_populates="conversation", cascade="all, delete"
+    )
+
+
+class Membership(Base):
+    """Also the member's inbox row: the last message, activity and unread
+    count are kept up to date as messages are stored and read, so listing a
+    user's conversations never aggregates over messages."""
+
+    __tablename__ = "membership"
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(
+        Integer, ForeignKey("conversation.id", ondelete="CASCADE"), nullable=False
+    )
+    conversation = relationship("Conversation", back_populates="memberships")
+    user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    joined = Column(DateTime, default=func.now())
+    last_message_id = Column(BigInteger, nullable=True)
+    last_activity = Column(DateTime, default=func.now(), nullable=False)
+    unread_count = Column(Integer, default=0, nullable=False)
+    last_read_message_id = Column(BigInteger, nullable=True)
+    # what the member's clients acknowledged, catch-up resumes after it
+    delivered_message_id = Column(BigInteger, nullable=True)
+    __table_args__ = (
+        UniqueConstraint("conversation_id", "user_id", name="_conversation_id_user_id"),
+        # the inbox: a user's conversations, most recently active first
+        Index(
+            "ix_membership_user_id_last_activity",
+            "user_id",
+            last_activity.desc(),
+            conversation_id.desc(),
+        ),
+    )
+
+
+class Message(Base):
+    """Hash partitioned by conversation, so history reads touch one partition
+    and appends spread over all of them. The primary key (conversation_id, id)
+    is the index history pages walk backwards on."""
+
+    __tablename__ = "message"
+    conversation_id = Column(
+        Integer, ForeignKey("conversation.id", ondelete="CASCADE"), nullable=False
+    )
+    id = Column(BigInteger, autoincrement=True, nullable=False)
+    sender_id = Column(Integer, ForeignKey("user.id", ondelete="SET NULL"))
+    body = Column(Text, nullable=False)
+    client_id = Column(String(64), nullable=True)
+    created = Column(DateTime, default=func.now())
+    __table_args__ = (
+        # declared, so that the key is not reordered with the sequence first
+        PrimaryKeyConstraint("conversation_id", "id"),
+        {"postgresql_partition_by": "HASH (conversation_id)"},
+    )
+
+
+class Attachment(Base):
+    """A file uploaded for chat in chunks. Until `path` is set the row is the
+    upload session: the bytes received so far are in a staging file and
+    `offset` is their count."""
+
+    __tablename__ = "attachment"
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(
+        Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=False
+    )
+    filename = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    offset = Column(BigInteger, default=0, nullable=False)
+    # names the staging file, which must not be guessable from the id
+    upload_token = Column(String(32), nullable=False)
+    # SHA-256 of the whole file, when the client declared one
+    checksum = Column(String(64), nullable=True)
+    # /media/<key> once complete
+    path = Column(String, nullable=True)
+    created = Column(DateTime, default=func.now())
+    updated = Column(DateTime, default=func.now(), onupdate=func.now())
+    __table_args__ = (
+        # media garbage collection looks stored blobs up by path
+        Index("ix_attachment_path", path),
+        # unfinished uploads, oldest first, for expiry
+        Index(
+            "ix_attachment_updated_pending", updated, postgresql_where=path.is_(None)
+        ),
+    )
@@ -1,4 +1,14 @@
-from sqlalchemy import String, Column, Integer, ForeignKey, Boolean, DateTime, func
+from sqlalchemy import (
+    String,
+    Column,
+    Integer,
+    ForeignKey,
+    Boolean,
+    DateTime,
+    Index,
+    JSON,
+    func,
+)
 from app.database import Base
 from sqlalchemy.orm import relationship
 
@@ -14,6 +24,20 @@ class User(Base):
     created = Column(DateTime, default=func.now())
     updated = Column(DateTime, default=func.now(), onupdate=func.now())
     profile = relationship("Profile", back_populates="user", uselist=False)
+    __table_args__ = (
+        Index(
+            "ix_user_username_trgm",
+            "username",
+            postgresql_using="gin",
+            postgresql_ops={"username": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_user_phone_number_trgm",
+            "phone_number",
+            postgresql_using="gin",
+            postgresql_ops={"phone_number": "gin_trgm_ops"},
+        ),
+    )
 
 
 class Profile(Base):
@@ -22,6 +46,7 @@ class Profile(Base):
     first_name = Column(String(50), nullable=True)
     last_name = Column(String(50), nullable=True)
     image = Column(String(255), nullable=True)
+    image_variants = Column(JSON, nullable=True)
     user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), unique=True)
     user = relationship("User", back_populates="profile")
     city_id = Column(Integer, ForeignKey("city.id", ondelete="CASCADE"))
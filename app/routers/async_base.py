@@ -0,0 +1,254 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_async_session
+from app.helpers.permissions import is_admin
+from app.models.base import City, Province
+from app.models.users import Profile
+from app.schemas.base import (
+    CityCreate,
+    CityResponse,
+    CityUpdate,
+    PaginatedCityResponse,
+    PaginatedProvinceResponse,
+    ProvinceCreate,
+    ProvinceResponse,
+    ProvinceUpdate,
+)
+from app.helpers.counting import CountMode, DEFAULT_COUNT_MODE
+from app.helpers.filter import DEFAULT_SEARCH_MODE, SearchMode
+from app.helpers.reference_cache import (
+    city_page_json,
+    get_city,
+    get_province,
+    province_page_json,
+)
+from app.helpers.responses import PreparedJSONResponse
+from app.helpers.helper_func import get_or_404_async
+
+async_base_router = APIRouter()
+
+
+@async_base_router.get("/province/", response_model=PaginatedProvinceResponse)
+async def province_list(
+    skip: int = Query(
+        0,
+        ge=0,
+        description="Number of records to skip (offset)",
+    ),
+    limit: int = Query(
+        10,
+        ge=1,
+        description="Number of records to return per page",
+    ),
+    name: Optional[str] = None,
+    after: Optional[str] = Query(
+        None, description="Cursor from next_cursor, returns the following page"
+    ),
+    before: Optional[str] = Query(
+        None, description="Cursor from previous_cursor, returns the preceding page"
+    ),
+    count: CountMode = Query(
+        DEFAULT_COUNT_MODE,
+        description="How total is computed: exact, estimate, cached or none",
+    ),
+    search: SearchMode = Query(
+        DEFAULT_SEARCH_MODE,
+        description="How text filters match: contains, prefix or exact",
+    ),
+    db: AsyncSession = Depends(get_async_session),
+):
+    return PreparedJSONResponse(
+        await db.run_sync(
+            province_page_json,
+            name=name,
+            skip=skip,
+            limit=limit,
+            after=after,
+            before=before,
+            count=count,
+            search_mode=search,
+        )
+    )
+
+
+@async_base_router.get(
+    "/province/{province_id}/",
+    response_model=ProvinceResponse,
+)
+async def province_detail(
+    province_id: int, db: AsyncSession = Depends(get_async_session)
+):
+    province = await db.run_sync(get_province, province_id)
+    if not province:
+        raise HTTPException(status_code=404, detail="Province not found")
+    return province
+
+
+@async_base_router.post("/province/")
+async def province_create(
+    request: ProvinceCreate,
+    _=Depends(is_admin),
+    db: AsyncSession = Depends(get_async_session),
+):
+    existing_province = await db.scalar(
+        select(Province).filter(Province.name == request.name)
+    )
+    if existing_province:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Province already exists.",
+        )
+    new_province = Province(name=request.name)
+    db.add(new_province)
+    await db.commit()
+    return {"message": "Province created successfully."}
+
+
+@async_base_router.patch("/province/{province_id}/")
+async def province_update(
+    province_id: int,
+    province_update: ProvinceUpdate,
+    _=Depends(is_admin),
+    db: AsyncSession = Depends(get_async_session),
+):
+    province = await get_or_404_async(db, Province, province_id)
+    if province_update.name:
+        existing_province = await db.scalar(
+            select(Province).filter(
+                Province.name == province_update.name, Province.id != province_id
+            )
+        )
+        if existing_province:
+            raise HTTPException(
+                status_code=400, detail="Province with this name already exist."
+            )
+
+    for field, value in province_update.dict(exclude_unset=True).items():
+        setattr(province, field, value)
+
+    await db.commit()
+    return {"message": "Province updated successfully."}
+
+
+@async_base_router.delete("/province/{province_id}/")
+async def province_delete(
+    province_id: int,
+    _=Depends(is_admin),
+    db: AsyncSession = Depends(get_async_session),
+):
+    province = await get_or_404_async(db, Province, province_id)
+    # relationship lazy loads are not available on AsyncSession, so check the
+    # dependants with EXISTS instead of loading `province.cities`/`profiles`
+    if await db.scalar(select(exists().where(City.province_id == province_id))):
+        raise HTTPException(
+            status_code=400,
+            detail="Cannot delete province because it has associated cities",
+        )
+    if await db.scalar(select(exists().where(Profile.province_id == province_id))):
+        raise HTTPException(
+            status_code=400,
+            detail="Cannot delete province because it has associated profiles",
+        )
+
+    await db.delete(province)
+    await db.commit()
+    return {"message": "province deleted successfully"}
+
+
+@async_base_router.get("/city/", response_model=PaginatedCityResponse)
+async def city_list(
+    skip: int = Query(0, ge=0, description="Number of records to skip (offset)"),
+    limit: int = Query(10, ge=1, description="Number of records to return per page"),
+    name: Optional[str] = None,
+    province: Optional[int] = None,
+    after: Optional[str] = Query(
+        None, description="Cursor from next_cursor, returns the following page"
+    ),
+    before: Optional[str] = Query(
+        None, description="Cursor from previous_cursor, returns the preceding page"
+    ),
+    count: CountMode = Query(
+        DEFAULT_COUNT_MODE,
+        description="How total is computed: exact, estimate, cached or none",
+    ),
+    search: SearchMode = Query(
+        DEFAULT_SEARCH_MODE,
+        description="How text filters match: contains, prefix or exact",
+    ),
+    db: AsyncSession = Depends(get_async_session),
+):
+    return PreparedJSONResponse(
+        await db.run_sync(
+            city_page_json,
+            name=name,
+            province_id=province,
+            skip=skip,
+            limit=limit,
+            after=after,
+            before=before,
+            count=count,
+            search_mode=search,
+        )
+    )
+
+
+@async_base_router.get("/city/{city_id}/", response_model=CityResponse)
+async def city_detail(city_id: int, db: AsyncSession = Depends(get_async_session)):
+    city = await db.run_sync(get_city, city_id)
+    if not city:
+        raise HTTPException(status_code=404, detail="City not found")
+    return city
+
+
+@async_base_router.post("/city/")
+async def city_create(
+    request: CityCreate,
+    db: AsyncSession = Depends(get_async_session),
+    _=Depends(is_admin),
+):
+    province = await get_or_404_async(db, Province, request.province_id)
+    city_exists = await db.scalar(
+        select(City).filter(City.province_id == province.id, City.name == request.name)
+    )
+    if city_exists:
+        raise HTTPException(
+            status_code=400,
+            detail="City with this name and province_id already exists!",
+        )
+    new_city = City(name=request.name, province_id=province.id)
+    db.add(new_city)
+    await db.commit()
+    return {"message": "City created successfully."}
+
+
+@async_base_router.patch("/city/{city_id}/")
+async def city_update(
+    city_update: CityUpdate,
+    city_id: int,
+    _=Depends(is_admin),
+    db: AsyncSession = Depends(get_async_session),
+):
+    city = await get_or_404_async(db, City, city_id)
+    for field, value in city_update.dict(exclude_unset=True).items():
+        setattr(city, field, value)
+    await db.commit()
+    return {"message": "City updated successfully."}
+
+
+@async_base_router.delete("/city/{city_id}/")
+async def city_delete(
+    city_id: int, _=Depends(is_admin), db: AsyncSession = Depends(get_async_session)
+):
+    city = await get_or_404_async(db, City, city_id)
+    if await db.scalar(select(exists().where(Profile.city_id == city_id))):
+        raise HTTPException(
+            status_code=400,
+            detail="Cannot delete city because it has associated profiles",
+        )
+    await db.delete(city)
+    await db.commit()
+    return {"message": "City deleted successfully."}
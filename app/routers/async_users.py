@@ -0,0 +1,160 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_async_session
+from app.helpers.auth_tools import sign_jwt
+from app.helpers.export import ExportFormat, export_filters, export_response
+from app.helpers.filter import (
+    DEFAULT_SEARCH_MODE,
+    ProfileFilter,
+    SearchMode,
+    profile_list_item,
+)
+from app.helpers.helper_func import run_hasher_async, verify_and_update_password
+from app.helpers.counting import CountMode, DEFAULT_COUNT_MODE, count_total_async
+from app.helpers.image_variants import variant_urls
+from app.helpers.media_store import media_url
+from app.helpers.pagination import KeysetPage
+from app.helpers.permissions import is_admin
+from app.helpers.responses import json_response
+from app.models.users import Profile, User
+from app.schemas.users import (
+    PaginatedProfileResponse,
+    ProfileDetailResponse,
+    RequestDetails,
+    TokenSchema,
+)
+from fastapi import Query, Request
+from typing import Optional
+
+from sqlalchemy.orm import joinedload
+
+
+# Only the read paths and login live here; create_user/update_user take
+# multipart uploads and the sync validation classes, so they keep running on
+# the threadpool from app/routers/users.py.
+async_user_router = APIRouter()
+
+
+@async_user_router.post("/login/", response_model=TokenSchema)
+async def login(request: RequestDetails, db: AsyncSession = Depends(get_async_session)):
+    user = await db.scalar(
+        select(User).filter(User.phone_number == request.phone_number)
+    )
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect phone_number"
+        )
+    # release the connection while bcrypt runs in the hashing pool
+    await db.commit()
+    verified, new_hash = await run_hasher_async(
+        verify_and_update_password, request.password, user.password
+    )
+    if not verified:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect password"
+        )
+    if new_hash:
+        user.password = new_hash
+        await db.commit()
+    access_token = sign_jwt(user)
+    return access_token
+
+
+@async_user_router.get("", response_model=PaginatedProfileResponse)
+async def users_list(
+    _=Depends(is_admin),
+    session: AsyncSession = Depends(get_async_session),
+    skip: int = Query(0, ge=0, description="Number of records to skip (offset)"),
+    limit: int = Query(10, ge=1, description="Number of records to return per page"),
+    province: Optional[int] = None,
+    city: Optional[int] = None,
+    username: Optional[str] = None,
+    phone_number: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    is_staff: Optional[bool] = None,
+    after: Optional[str] = Query(
+        None, description="Cursor from next_cursor, returns the following page"
+    ),
+    before: Optional[str] = Query(
+        None, description="Cursor from previous_cursor, returns the preceding page"
+    ),
+    count: CountMode = Query(
+        DEFAULT_COUNT_MODE,
+        description="How total is computed: exact, estimate, cached or none",
+    ),
+    search: SearchMode = Query(
+        DEFAULT_SEARCH_MODE,
+        description="How text filters match: contains, prefix or exact",
+    ),
+):
+    query = ProfileFilter().filter(
+        username=username,
+        phone_number=phone_number,
+        province=province,
+        city=city,
+        is_active=is_active,
+        is_staff=is_staff,
+        search_mode=search,
+        lean=True,
+    )
+
+    total = await count_total_async(session, query, count)
+    page = KeysetPage(Profile.id, skip=skip, limit=limit, after=after, before=before)
+    rows, cursors = page.paginate((await session.execute(page.apply(query))).all())
+    return json_response(
+        PaginatedProfileResponse,
+        {
+            "total": total,
+            "skip": skip,
+            "limit": limit,
+            "profiles": [profile_list_item(row) for row in rows],
+            **cursors,
+        },
+    )
+
+
+@async_user_router.get("/export/")
+async def export_users(
+    request: Request,
+    _=Depends(is_admin),
+    format: ExportFormat = Query(ExportFormat.csv, description="csv or ndjson"),
+    filters: dict = Depends(export_filters),
+):
+    return export_response(request, filters, format)
+
+
+@async_user_router.get("/{profile_id}/", response_model=ProfileDetailResponse)
+async def users_deatil(
+    profile_id: int,
+    _=Depends(is_admin),
+    db: AsyncSession = Depends(get_async_session),
+):
+    profile = await db.scalar(
+        select(Profile)
+        .options(
+            joinedload(Profile.user),
+            joinedload(Profile.city),
+            joinedload(Profile.province),
+        )
+        .filter(Profile.id == profile_id)
+    )
+    if not profile:
+        raise HTTPException(detail="Profile not found", status_code=404)
+
+    return json_response(
+        ProfileDetailResponse,
+        {
+            "image": media_url(profile.image),
+            "image_variants": variant_urls(profile),
+            "first_name": profile.first_name,
+            "last_name": profile.last_name,
+            "username": profile.user.username,
+            "phone_number": profile.user.username,
+            "is_active": profile.user.is_active,
+            "is_staff": profile.user.is_staff,
+            "city": {"id": profile.city.id, "name": profile.city.name},
+            "province": {"id": profile.province.id, "name": profile.province.name},
+        },
+    )
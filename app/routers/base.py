@@ -4,7 +4,6 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from app.database import get_session
-from app.helpers.filter import CityFilter, ProvinceFilter
 from app.helpers.permissions import is_admin
 from app.models.base import City, Province
 from app.schemas.base import (
@@ -17,6 +16,15 @@ from app.schemas.base import (
     ProvinceResponse,
     ProvinceUpdate,
 )
+from app.helpers.counting import CountMode, DEFAULT_COUNT_MODE
+from app.helpers.filter import DEFAULT_SEARCH_MODE, SearchMode
+from app.helpers.reference_cache import (
+    city_page_json,
+    get_city,
+    get_province,
+    province_page_json,
+)
+from app.helpers.responses import PreparedJSONResponse
 from app.helpers.helper_func import get_or_404
 
 base_router = APIRouter()
@@ -26,24 +34,43 @@ base_router = APIRouter()
 def province_list(
     skip: int = Query(
         0,
+        ge=0,
         description="Number of records to skip (offset)",
     ),
     limit: int = Query(
         10,
+        ge=1,
         description="Number of records to return per page",
     ),
     name: Optional[str] = None,
+    after: Optional[str] = Query(
+        None, description="Cursor from next_cursor, returns the following page"
+    ),
+    before: Optional[str] = Query(
+        None, description="Cursor from previous_cursor, returns the preceding page"
+    ),
+    count: CountMode = Query(
+        DEFAULT_COUNT_MODE,
+        description="How total is computed: exact, estimate, cached or none",
+    ),
+    search: SearchMode = Query(
+        DEFAULT_SEARCH_MODE,
+        description="How text filters match: contains, prefix or exact",
+    ),
     db: Session = Depends(get_session),
 ):
-    query = ProvinceFilter(db).filter(name=name)
-    total = query.count()
-    provinces = query.offset(skip).limit(limit).all()
-    return {
-        "total": total,
-        "skip": skip,
-        "limit": limit,
-        "provinces": provinces,
-    }
+    return PreparedJSONResponse(
+        province_page_json(
+            db,
+            name=name,
+            skip=skip,
+            limit=limit,
+            after=after,
+            before=before,
+            count=count,
+            search_mode=search,
+        )
+    )
 
 
 @base_router.get(
@@ -51,7 +78,9 @@ def province_list(
     response_model=ProvinceResponse,
 )
 def province_detail(province_id: int, db: Session = Depends(get_session)):
-    province = get_or_404(db, Province, province_id)
+    province = get_province(db, province_id)
+    if not province:
+        raise HTTPException(status_code=404, detail="Province not found")
     return province
 
 
@@ -130,21 +159,44 @@ def province_delete(
 
 @base_router.get("/city/", response_model=PaginatedCityResponse)
 def city_list(
-    skip: int = Query(0, description="Number of records to skip (offset)"),
-    limit: int = Query(10, description="Number of records to return per page"),
+    skip: int = Query(0, ge=0, description="Number of records to skip (offset)"),
+    limit: int = Query(10, ge=1, description="Number of records to return per page"),
     name: Optional[str] = None,
     province: Optional[int] = None,
+    after: Optional[str] = Query(
+        None, description="Cursor from next_cursor, returns the following page"
+    ),
+    before: Optional[str] = Query(
+        None, description="Cursor from previous_cursor, returns the preceding page"
+    ),
+    count: CountMode = Query(
+        DEFAULT_COUNT_MODE,
+        description="How total is computed: exact, estimate, cached or none",
+    ),
+    search: SearchMode = Query(
+        DEFAULT_SEARCH_MODE,
+        description="How text filters match: contains, prefix or exact",
+    ),
     db: Session = Depends(get_session),
 ):
-    query = CityFilter(db).filter(name=name, province_id=province)
-    totlal = query.count()
-    cities = query.offset(skip).limit(limit).all()
-    return {"total": totlal, "skip": skip, "limit": limit, "cities": cities}
+    return PreparedJSONResponse(
+        city_page_json(
+            db,
+            name=name,
+            province_id=province,
+            skip=skip,
+            limit=limit,
+            after=after,
+            before=before,
+            count=count,
+            search_mode=search,
+        )
+    )
 
 
 @base_router.get("/city/{city_id}/", response_model=CityResponse)
 def city_detail(city_id: int, db: Session = Depends(get_session)):
-    city = get_or_404(db, City, city_id)
+    city = get_city(db, city_id)
     if not city:
         raise HTTPException(status_code=404, detail="City not found")
     return city
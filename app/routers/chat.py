@@ -0,0 +1,340 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.database import AsyncSessionLocal, get_session
+from app.helpers.attachments import (
+    append_chunk,
+    attachment_item,
+    complete_upload,
+    create_upload,
+    get_upload,
+)
+from app.helpers.auth_tools import decode_jwt_cached
+from app.helpers.chat_store import (
+    MESSAGE_COLUMNS,
+    catch_up,
+    cursors,
+    encode_inbox_cursor,
+    inbox_item,
+    inbox_query,
+    is_member,
+    membership_exists,
+    message_item,
+    record_read,
+    writer,
+)
+from app.helpers.connection_manager import (
+    CLOSE_POLICY_VIOLATION,
+    Connection,
+    encode_event,
+    manager,
+)
+from app.helpers.pagination import KeysetPage
+from app.helpers.permissions import is_active_user
+from app.helpers.presence import PRESENCE_MAX_LOOKUP, presence
+from app.helpers.responses import json_response
+from app.models.chat import Conversation, Membership, Message
+from app.models.users import User
+from app.schemas.chat import (
+    AckFrame,
+    ClientFrame,
+    ConversationCreate,
+    ConversationResponse,
+    InboxResponse,
+    JoinFrame,
+    LeaveFrame,
+    MessageFrame,
+    MessageHistoryResponse,
+    PingFrame,
+    PresenceResponse,
+    ReadFrame,
+    ReadRequest,
+    ReadResponse,
+    SHA256_PATTERN,
+    TypingFrame,
+    UploadCreate,
+    UploadResponse,
+)
+
+
+logger = logging.getLogger(__name__)
+
+chat_router = APIRouter()
+
+
+def authenticate(websocket: WebSocket) -> Optional[dict]:
+    """Reads the token from `?token=` (browsers cannot set headers on a
+    WebSocket) or the Authorization header, and checks it against the token
+    cache like JWTBearer does, without touching the database."""
+    token = websocket.query_params.get("token")
+    if token is None:
+        parts = websocket.headers.get("authorization", "").split()
+        token = parts[-1] if parts else None
+    payload = decode_jwt_cached(token) if token else None
+    if payload and payload.get("is_active"):
+        return payload
+    return None
+
+
+def error(detail) -> dict:
+    return {"type": "error", "detail": detail}
+
+
+async def handle_frame(connection: Connection, frame):
+    match frame:
+        case JoinFrame():
+            if frame.conversation_id in connection.conversations:
+                return
+            async with AsyncSessionLocal() as session:
+                member = await is_member(
+                    session, frame.conversation_id, connection.user_id
+                )
+            if not member:
+                connection.send(encode_event(error("Conversation not found")))
+                return
+            manager.join(connection, frame.conversation_id)
+            presence.joined(connection, frame.conversation_id)
+        case LeaveFrame():
+            manager.leave(connection, frame.conversation_id)
+        case MessageFrame():
+            if frame.conversation_id not in connection.conversations:
+                connection.send(
+                    encode_event(error("Join the conversation before sending"))
+                )
+            elif not writer.submit(connection, frame):
+                connection.send(encode_event(error("Server busy, try again")))
+        case ReadFrame():
+            receipt = await record_read(
+                frame.conversation_id, connection.user_id, frame.message_id
+            )
+            if receipt is None:
+                connection.send(encode_event(error("Conversation not found")))
+        case AckFrame():
+            cursors.ack(frame.conversation_id, connection.user_id, frame.message_id)
+        case TypingFrame():
+            if frame.conversation_id in connection.conversations:
+                presence.typed(connection, frame.conversation_id)
+        case PingFrame():
+            connection.send(encode_event({"type": "pong"}))
+
+
+@chat_router.websocket("/ws")
+async def chat_socket(websocket: WebSocket, since: Optional[int] = None):
+    user = authenticate(websocket)
+    if user is None:
+        await websocket.close(CLOSE_POLICY_VIOLATION)
+        return
+    connection = await manager.connect(websocket, user["user_id"])
+    if connection is None:
+        return
+    presence.connected(connection)
+    # missed messages, from `?since=` or what each conversation delivered last
+    catchup = asyncio.create_task(catch_up(connection, since))
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            connection.last_seen = time.monotonic()
+            raw = message.get("text")
+            if raw is None:
+                connection.send(encode_event(error("Frames must be text")))
+                continue
+            try:
+                frame = ClientFrame.validate_json(raw)
+            except ValidationError as e:
+                connection.send(
+                    encode_event(
+                        error(
+                            e.errors(
+                                include_url=False,
+                                include_context=False,
+                                include_input=False,
+                            )
+                        )
+                    )
+                )
+                continue
+            try:
+                await handle_frame(connection, frame)
+            except Exception:
+                # e.g. the database is unavailable; the socket stays usable
+                logger.exception("Could not handle a %s frame", frame.type)
+                connection.send(encode_event(error("Could not handle the frame")))
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: the socket was closed by the manager meanwhile
+        pass
+    finally:
+        catchup.cancel()
+        presence.disconnected(connection)
+        await manager.disconnect(connection)
+
+
+@chat_router.post("/conversations/", response_model=ConversationResponse)
+def create_conversation(
+    request: ConversationCreate,
+    user: dict = Depends(is_active_user),
+    db: Session = Depends(get_session),
+):
+    member_ids = set(request.member_ids) | {user["user_id"]}
+    found = set(db.scalars(select(User.id).filter(User.id.in_(member_ids))))
+    if found != member_ids:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Users not found: {sorted(member_ids - found)}",
+        )
+    conversation = Conversation(title=request.title, created_by=user["user_id"])
+    conversation.memberships = [
+        Membership(user_id=member_id) for member_id in sorted(member_ids)
+    ]
+    db.add(conversation)
+    db.commit()
+    return {
+        "id": conversation.id,
+        "title": conversation.title,
+        "member_ids": sorted(member_ids),
+    }
+
+
+@chat_router.get(
+    "/conversations/{conversation_id}/messages/",
+    response_model=MessageHistoryResponse,
+)
+def conversation_messages(
+    conversation_id: int,
+    user: dict = Depends(is_active_user),
+    db: Session = Depends(get_session),
+    limit: int = Query(50, ge=1, le=200, description="Messages per page"),
+    after: Optional[str] = Query(
+        None, description="Cursor from next_cursor, returns older messages"
+    ),
+    before: Optional[str] = Query(
+        None, description="Cursor from previous_cursor, returns newer messages"
+    ),
+):
+    if not db.scalar(membership_exists(conversation_id, user["user_id"])):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    # newest first; the (conversation_id, id) primary key of the conversation's
+    # partition serves both the filter and the order, whatever the page depth
+    query = (
+        select(*MESSAGE_COLUMNS)
+        .filter(Message.conversation_id == conversation_id)
+        .order_by(Message.id.desc())
+    )
+    page = KeysetPage(Message.id, limit=limit, after=after, before=before)
+    rows, cursors = page.paginate(db.execute(page.apply(query)).all())
+    return json_response(
+        MessageHistoryResponse,
+        {
+            "limit": limit,
+            "messages": [message_item(row) for row in rows],
+            **cursors,
+        },
+    )
+
+
+@chat_router.post("/conversations/{conversation_id}/read/", response_model=ReadResponse)
+async def read_conversation(
+    conversation_id: int,
+    request: ReadRequest,
+    user: dict = Depends(is_active_user),
+):
+    # async so that the receipt can be pushed to the user's sockets
+    receipt = await record_read(conversation_id, user["user_id"], request.message_id)
+    if receipt is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return receipt
+
+
+@chat_router.get("/inbox/", response_model=InboxResponse)
+def inbox(
+    user: dict = Depends(is_active_user),
+    db: Session = Depends(get_session),
+    limit: int = Query(20, ge=1, le=100, description="Conversations per page"),
+    after: Optional[str] = Query(
+        None, description="Cursor from next_cursor, returns the following page"
+    ),
+):
+    rows = db.execute(inbox_query(user["user_id"], limit, after)).all()
+    return json_response(
+        InboxResponse,
+        {
+            "limit": limit,
+            "conversations": [inbox_item(row) for row in rows[:limit]],
+            "next_cursor": (
+                encode_inbox_cursor(rows[limit - 1]) if len(rows) > limit else None
+            ),
+        },
+    )
+
+
+@chat_router.get("/presence/", response_model=PresenceResponse)
+def online_users(
+    _=Depends(is_active_user),
+    user_ids: List[int] = Query(
+        ..., max_length=PRESENCE_MAX_LOOKUP, description="Users to look up"
+    ),
+):
+    # answered from memory, every worker knows the users of the others
+    return {"online": presence.online(user_ids)}
+
+
+@chat_router.post("/uploads/", response_model=UploadResponse)
+def start_upload(
+    request: UploadCreate,
+    user: dict = Depends(is_active_user),
+    db: Session = Depends(get_session),
+):
+    return attachment_item(create_upload(db, user["user_id"], request))
+
+
+@chat_router.get("/uploads/{attachment_id}/", response_model=UploadResponse)
+def upload_status(
+    attachment_id: int,
+    user: dict = Depends(is_active_user),
+    db: Session = Depends(get_session),
+):
+    # where to resume from after a failed chunk
+    return attachment_item(get_upload(db, attachment_id, user["user_id"]))
+
+
+@chat_router.patch("/uploads/{attachment_id}/", response_model=UploadResponse)
+async def upload_chunk(
+    attachment_id: int,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Where the chunk starts"),
+    checksum: str = Query(
+        ..., pattern=SHA256_PATTERN, description="SHA-256 of the chunk, hex"
+    ),
+    user: dict = Depends(is_active_user),
+):
+    # async so that the raw body is written as it arrives, never held whole
+    attachment = await append_chunk(
+        attachment_id, user["user_id"], offset, checksum, request
+    )
+    return attachment_item(attachment)
+
+
+@chat_router.post("/uploads/{attachment_id}/complete/", response_model=UploadResponse)
+def finish_upload(
+    attachment_id: int,
+    user: dict = Depends(is_active_user),
+    db: Session = Depends(get_session),
+):
+    attachment = get_upload(db, attachment_id, user["user_id"])
+    return attachment_item(complete_upload(db, attachment))
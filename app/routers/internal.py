@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends
+
+from app.database import pool_status
+from app.helpers.auth_tools import token_cache
+from app.helpers.chat_store import cursors, writer
+from app.helpers.connection_manager import manager
+from app.helpers.counting import count_cache
+from app.helpers.reference_cache import reference_cache
+from app.helpers.permissions import is_admin
+from app.helpers.presence import presence
+
+internal_router = APIRouter()
+
+
+@internal_router.get("/pool")
+def pool(_=Depends(is_admin)):
+    return pool_status()
+
+
+@internal_router.get("/cache")
+def cache(_=Depends(is_admin)):
+    return {
+        "reference": reference_cache.stats(),
+        "count": count_cache.stats(),
+        "token": token_cache.stats(),
+    }
+
+
+@internal_router.get("/chat")
+def chat(_=Depends(is_admin)):
+    return {
+        **manager.stats(),
+        "writer": writer.stats(),
+        "cursors": cursors.stats(),
+        "presence": presence.stats(),
+    }
@@ -1,22 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.database import get_session
 from app.helpers.auth_tools import sign_jwt
-from app.helpers.filter import ProfileFilter
-from app.helpers.helper_func import verify_password
+from app.helpers.bulk_import import ImportFormat, UserImporter, read_rows
+from app.helpers.export import ExportFormat, export_filters, export_response
+from app.helpers.filter import (
+    DEFAULT_SEARCH_MODE,
+    ProfileFilter,
+    SearchMode,
+    profile_list_item,
+)
+from app.helpers.helper_func import (
+    release_connection,
+    run_hasher,
+    verify_and_update_password,
+)
+from app.helpers.counting import CountMode, DEFAULT_COUNT_MODE, count_total
+from app.helpers.image_variants import generate_variants, variant_urls
+from app.helpers.media_store import media_url
+from app.helpers.pagination import KeysetPage
 from app.helpers.permissions import is_admin
+from app.helpers.responses import json_response
+from app.helpers.uploads import publish_on_success
 from app.models.users import Profile, User
 from app.schemas.users import (
+    PaginatedProfileResponse,
+    ProfileDetailResponse,
     RequestDetails,
     TokenSchema,
 )
-from fastapi import UploadFile, Form, File, Query
+from fastapi import UploadFile, Form, File, Query, Request
 from typing import Annotated, Optional
 
 from sqlalchemy.orm import joinedload
-from decouple import config
-from ..validations.user_profile_validation import user_profile_factory
+from ..validations.user_profile_validation import (
+    commit_user,
+    user_profile_factory,
+    user_profile_lookup,
+)
 
 
 user_router = APIRouter()
@@ -29,51 +51,72 @@ def login(request: RequestDetails, db: Session = Depends(get_session)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect phone_number"
         )
-    if not verify_password(request.password, user.password):
+    release_connection(db)
+    verified, new_hash = run_hasher(
+        verify_and_update_password, request.password, user.password
+    )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect password"
         )
+    if new_hash:
+        user.password = new_hash
+        db.commit()
     access_token = sign_jwt(user)
     return access_token
 
 
-@user_router.get("")
+@user_router.get("", response_model=PaginatedProfileResponse)
 def users_list(
     _=Depends(is_admin),
     session: Session = Depends(get_session),
-    skip: int = Query(0, description="Number of records to skip (offset)"),
-    limit: int = Query(10, description="Number of records to return per page"),
+    skip: int = Query(0, ge=0, description="Number of records to skip (offset)"),
+    limit: int = Query(10, ge=1, description="Number of records to return per page"),
     province: Optional[int] = None,
     city: Optional[int] = None,
     username: Optional[str] = None,
     phone_number: Optional[str] = None,
     is_active: Optional[bool] = None,
     is_staff: Optional[bool] = None,
+    after: Optional[str] = Query(
+        None, description="Cursor from next_cursor, returns the following page"
+    ),
+    before: Optional[str] = Query(
+        None, description="Cursor from previous_cursor, returns the preceding page"
+    ),
+    count: CountMode = Query(
+        DEFAULT_COUNT_MODE,
+        description="How total is computed: exact, estimate, cached or none",
+    ),
+    search: SearchMode = Query(
+        DEFAULT_SEARCH_MODE,
+        description="How text filters match: contains, prefix or exact",
+    ),
 ):
-    query = ProfileFilter(db=session).filter(
+    query = ProfileFilter().filter(
         username=username,
         phone_number=phone_number,
         province=province,
         city=city,
         is_active=is_active,
         is_staff=is_staff,
+        search_mode=search,
+        lean=True,
     )
 
-    total = query.count()
-    profiles = query.offset(skip).limit(limit).all()
-    profiles_list = [
+    total = count_total(session, query, count)
+    page = KeysetPage(Profile.id, skip=skip, limit=limit, after=after, before=before)
+    rows, cursors = page.paginate(session.execute(page.apply(query)).all())
+    return json_response(
+        PaginatedProfileResponse,
         {
-            "id": profile.id,
-            "username": profile.user.username,
-            "phone_number": profile.user.phone_number,
-            "city": {"id": profile.city.id, "name": profile.city.name},
-            "province": {"id": profile.province.id, "name": profile.province.name},
-            "is_active": profile.user.is_active,
-            "is_staff": profile.user.is_staff,
-        }
-        for profile in profiles
-    ]
-    return {"total": total, "skip": skip, "limit": limit, "profiles": profiles_list}
+            "total": total,
+            "skip": skip,
+            "limit": limit,
+            "profiles": [profile_list_item(row) for row in rows],
+            **cursors,
+        },
+    )
 
 
 @user_router.post("")
@@ -86,12 +129,20 @@ def create_user(
     first_name: Annotated[str, Form()] = None,
     last_name: Annotated[str, Form()] = None,
     image: Annotated[UploadFile, File()] = None,
+    background_tasks: BackgroundTasks = None,
     db: Session = Depends(get_session),
     _=Depends(is_admin),
 ):
+    lookup = user_profile_lookup(
+        db, username=username, phone_number=phone_number, province=province, city=city
+    )
     user_validation_class = user_profile_factory("create_user_validation")
     create_user_validation = user_validation_class(
-        db=db, username=username, phone_number=phone_number, password=password
+        db=db,
+        username=username,
+        phone_number=phone_number,
+        password=password,
+        lookup=lookup,
     )
 
     user_data = create_user_validation.validate_input_data()
@@ -105,16 +156,43 @@ def create_user(
         last_name=last_name,
         image=image,
         phone_number=phone_number,
+        lookup=lookup,
     )
     profile_data = create_profile_validation.validate_input_data()
     profile_data.update({"user": user})
     profile = Profile(**profile_data)
     db.add_all([user, profile])
-    db.commit()
+    with publish_on_success(create_profile_validation.staged_image):
+        commit_user(db)
+    if create_profile_validation.staged_image:
+        background_tasks.add_task(generate_variants, profile.id, profile.image)
     return {"message": "User created successfully"}
 
 
-@user_router.get("/{profile_id}/")
+@user_router.post("/import/")
+def import_users(
+    file: Annotated[UploadFile, File()],
+    format: Optional[ImportFormat] = Query(
+        None, description="csv or jsonl, defaults to the file extension"
+    ),
+    db: Session = Depends(get_session),
+    _=Depends(is_admin),
+):
+    format = format or ImportFormat.from_filename(file.filename)
+    return UserImporter(db).run(read_rows(file.file, format))
+
+
+@user_router.get("/export/")
+def export_users(
+    request: Request,
+    _=Depends(is_admin),
+    format: ExportFormat = Query(ExportFormat.csv, description="csv or ndjson"),
+    filters: dict = Depends(export_filters),
+):
+    return export_response(request, filters, format)
+
+
+@user_router.get("/{profile_id}/", response_model=ProfileDetailResponse)
 def users_deatil(
     profile_id: int, _=Depends(is_admin), db: Session = Depends(get_session)
 ):
@@ -132,19 +210,21 @@ def users_deatil(
     if not profile:
         raise HTTPException(detail="Profile not found", status_code=404)
 
-    return {
-        "image": config("HOST", default="http://127.0.0.1:8000") + profile.image
-        if profile.image
-        else None,
-        "first_name": profile.first_name,
-        "last_name": profile.last_name,
-        "username": profile.user.username,
-        "phone_number": profile.user.username,
-        "is_active": profile.user.is_active,
-        "is_staff": profile.user.is_staff,
-        "city": {"id": profile.city.id, "name": profile.city.name},
-        "province": {"id": profile.province.id, "name": profile.province.name},
-    }
+    return json_response(
+        ProfileDetailResponse,
+        {
+            "image": media_url(profile.image),
+            "image_variants": variant_urls(profile),
+            "first_name": profile.first_name,
+            "last_name": profile.last_name,
+            "username": profile.user.username,
+            "phone_number": profile.user.username,
+            "is_active": profile.user.is_active,
+            "is_staff": profile.user.is_staff,
+            "city": {"id": profile.city.id, "name": profile.city.name},
+            "province": {"id": profile.province.id, "name": profile.province.name},
+        },
+    )
 
 
 @user_router.patch("/{profile_id}/")
@@ -158,6 +238,7 @@ def update_user(
     first_name: Annotated[str, Form()] = None,
     last_name: Annotated[str, Form()] = None,
     image: Annotated[UploadFile, File()] = None,
+    background_tasks: BackgroundTasks = None,
     db: Session = Depends(get_session),
     _=Depends(is_admin),
 ):
@@ -174,6 +255,14 @@ def update_user(
     if not profile:
         raise HTTPException(detail="Profile not found", status_code=404)
     user = profile.user
+    lookup = user_profile_lookup(
+        db,
+        username=username,
+        phone_number=phone_number,
+        province=province,
+        city=city,
+        profile=profile,
+    )
     user_validation_class = user_profile_factory("update_user_validation")
     update_user_validation = user_validation_class(
         db=db,
@@ -181,6 +270,7 @@ def update_user(
         phone_number=phone_number,
         password=password,
         user=user,
+        lookup=lookup,
     )
     user_data = update_user_validation.validate_input_data()
     profile_validation_class = user_profile_factory("update_profile_validation")
@@ -192,6 +282,8 @@ def update_user(
         last_name=last_name,
         image=image,
         phone_number=phone_number if phone_number else user.phone_number,
+        profile=profile,
+        lookup=lookup,
     )
     profile_data = update_profile_validation.validate_input_data()
 
@@ -206,5 +298,8 @@ def update_user(
         for field, value in profile_data.items():
             setattr(profile, field, value)
 
-    db.commit()
+    with publish_on_success(update_profile_validation.staged_image):
+        commit_user(db)
+    if update_profile_validation.staged_image:
+        background_tasks.add_task(generate_variants, profile.id, profile.image)
     return {"message": "Profile updated successfully."}
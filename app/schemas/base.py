@@ -10,10 +10,12 @@ class ProvinceResponse(BaseModel):
 
 
 class PaginatedProvinceResponse(BaseModel):
-    total: int
+    total: Optional[int]
     skip: int
     limit: int
     provinces: List[ProvinceResponse]
+    next_cursor: Optional[str] = None
+    previous_cursor: Optional[str] = None
 
 
 class ProvinceCreate(BaseModel):
@@ -50,7 +52,9 @@ class CitySchema(BaseModel):
 
 
 class PaginatedCityResponse(BaseModel):
-    total: int
+    total: Optional[int]
     skip: int
     limit: int
     cities: List[CityResponse]
+    next_cursor: Optional[str] = None
+    previous_cursor: Optional[str] = None
@@ -0,0 +1,150 @@
+import datetime
+from typing import Annotated, List, Literal, Optional, Union
+
+from decouple import config
+from pydantic import BaseModel, Field, StringConstraints, TypeAdapter
+
+
+CHAT_MAX_MESSAGE_LENGTH = config("CHAT_MAX_MESSAGE_LENGTH", default=4000, cast=int)
+SHA256_PATTERN = r"^[0-9a-f]{64}$"
+# message ids are BIGINT
+MAX_MESSAGE_ID = 2**63 - 1
+ATTACHMENT_MAX_SIZE = config("ATTACHMENT_MAX_SIZE", default=100 * 1024 * 1024, cast=int)
+
+
+class JoinFrame(BaseModel):
+    type: Literal["join"]
+    conversation_id: int
+
+
+class LeaveFrame(BaseModel):
+    type: Literal["leave"]
+    conversation_id: int
+
+
+class MessageFrame(BaseModel):
+    type: Literal["message"]
+    conversation_id: int
+    body: Annotated[
+        str, StringConstraints(min_length=1, max_length=CHAT_MAX_MESSAGE_LENGTH)
+    ]
+    # echoed back so the sender can match the event to its pending message
+    client_id: Optional[Annotated[str, StringConstraints(max_length=64)]] = None
+
+
+class ReadFrame(BaseModel):
+    type: Literal["read"]
+    conversation_id: int
+    message_id: int
+
+
+class AckFrame(BaseModel):
+    # everything up to message_id arrived in the conversation
+    type: Literal["ack"]
+    conversation_id: int
+    message_id: Annotated[int, Field(ge=1, le=MAX_MESSAGE_ID)]
+
+
+class TypingFrame(BaseModel):
+    type: Literal["typing"]
+    conversation_id: int
+
+
+class PingFrame(BaseModel):
+    type: Literal["ping"]
+
+
+class PongFrame(BaseModel):
+    type: Literal["pong"]
+
+
+ClientFrame = TypeAdapter(
+    Annotated[
+        Union[
+            JoinFrame,
+            LeaveFrame,
+            MessageFrame,
+            ReadFrame,
+            AckFrame,
+            TypingFrame,
+            PingFrame,
+            PongFrame,
+        ],
+        Field(discriminator="type"),
+    ]
+)
+
+
+class ConversationCreate(BaseModel):
+    title: Optional[Annotated[str, StringConstraints(max_length=100)]] = None
+    # the creator is always a member
+    member_ids: List[int] = []
+
+
+class ConversationResponse(BaseModel):
+    id: int
+    title: Optional[str]
+    member_ids: List[int]
+
+
+class MessageResponse(BaseModel):
+    id: int
+    conversation_id: int
+    sender_id: Optional[int]
+    body: str
+    client_id: Optional[str]
+    created: datetime.datetime
+
+
+class MessageHistoryResponse(BaseModel):
+    limit: int
+    messages: List[MessageResponse]
+    next_cursor: Optional[str] = None
+    previous_cursor: Optional[str] = None
+
+
+class ReadRequest(BaseModel):
+    message_id: int
+
+
+class ReadResponse(BaseModel):
+    conversation_id: int
+    last_read_message_id: Optional[int]
+    unread_count: int
+
+
+class InboxItem(BaseModel):
+    conversation_id: int
+    title: Optional[str]
+    unread_count: int
+    last_read_message_id: Optional[int]
+    last_activity: datetime.datetime
+    last_message: Optional[MessageResponse]
+
+
+class InboxResponse(BaseModel):
+    limit: int
+    conversations: List[InboxItem]
+    next_cursor: Optional[str] = None
+
+
+class PresenceResponse(BaseModel):
+    online: List[int]
+
+
+class UploadCreate(BaseModel):
+    filename: Annotated[str, StringConstraints(min_length=1, max_length=255)]
+    size: Annotated[int, Field(gt=0, le=ATTACHMENT_MAX_SIZE)]
+    # SHA-256 of the whole file, hex; checked once the upload is complete
+    checksum: Optional[Annotated[str, StringConstraints(pattern=SHA256_PATTERN)]] = None
+
+
+class UploadResponse(BaseModel):
+    id: int
+    filename: str
+    content_type: str
+    size: int
+    offset: int
+    complete: bool
+    url: Optional[str]
+    chunk_size: int
@@ -6,7 +6,7 @@ from pydantic import BaseModel
 from app.schemas.base import CitySchema, ProvinceResponse
 
 from ..validations.user_profile_validation import CreateUserValidation
-from typing import List, Annotated
+from typing import Dict, List, Annotated, Optional
 
 
 class RequestDetails(BaseModel):
@@ -22,19 +22,37 @@ class TokenSchema(BaseModel):
 
 class ProfileResponse(BaseModel):
     id: int
+    # for /chat/presence/
+    user_id: int
     username: str
     phone_number: str
     city: CitySchema
     province: ProvinceResponse
     is_active: bool
     is_staff: bool
+    image_variants: Optional[Dict[str, str]] = None
+
+
+class ProfileDetailResponse(BaseModel):
+    image: Optional[str]
+    image_variants: Optional[Dict[str, str]]
+    first_name: Optional[str]
+    last_name: Optional[str]
+    username: str
+    phone_number: str
+    is_active: bool
+    is_staff: bool
+    city: CitySchema
+    province: ProvinceResponse
 
 
 class PaginatedProfileResponse(BaseModel):
-    total: int
+    total: Optional[int]
     skip: int
     limit: int
     profiles: List[ProfileResponse]
+    next_cursor: Optional[str] = None
+    previous_cursor: Optional[str] = None
 
 
 class TokenCreate(BaseModel):
@@ -1,6 +1,6 @@
 from fastapi import HTTPException
+from ..helpers.reference_cache import get_city, get_province
 from ..interface.base_validation_interface import BaseValidationInterface
-from ..models.base import City, Province
 
 
 class BaseValidation(BaseValidationInterface):
@@ -8,19 +8,15 @@ class BaseValidation(BaseValidationInterface):
         self.db = db
 
     def validate_province(self, value):
-        province = self.db.query(Province).filter(Province.id == value).first()
+        province = get_province(self.db, value)
         if province:
-            return province
+            return self.db.merge(province, load=False)
         else:
             raise HTTPException(detail="Province not found", status_code=400)
 
     def validate_city(self, province_id, value):
-        city = (
-            self.db.query(City)
-            .filter(City.id == value, City.province_id == province_id)
-            .first()
-        )
-        if city:
-            return city
+        city = get_city(self.db, value)
+        if city and city.province_id == province_id:
+            return self.db.merge(city, load=False)
         else:
             raise HTTPException(detail="City not found", status_code=400)
@@ -1,14 +1,106 @@
 import re
+from decouple import config
 from fastapi import HTTPException
+from sqlalchemy import exists, select
+from sqlalchemy.exc import IntegrityError
 
-from ..helpers.helper_func import get_hashed_password
+from ..helpers.helper_func import get_hashed_password, release_connection, run_hasher
 from ..interface.user_profile_validation_interface import CreateUserValidationInterface
+from ..models.base import City, Province
 from ..models.users import User
 from .base_validation import BaseValidation
-from ..config import BASE_DIR
-from pathlib import Path
-import shutil
-import uuid
+from ..helpers.media_store import media_path
+from ..helpers.uploads import stage_image
+
+
+BATCHED_VALIDATION = config("BATCHED_VALIDATION", default=True, cast=bool)
+
+
+class UserProfileLookup:
+    """Answers the uniqueness and province/city checks of a user create or
+    update with a single SELECT of EXISTS flags. Concurrent writers are left
+    to the unique constraints, see `commit_user`."""
+
+    def __init__(
+        self,
+        db,
+        username=None,
+        phone_number=None,
+        province=None,
+        city=None,
+        profile=None,
+    ):
+        self.db = db
+        self.username = username
+        self.phone_number = phone_number
+        self.user_id = profile.user_id if profile else None
+        self.province = province
+        self.city = city
+        if profile and (province or city):
+            self.province = province or profile.province_id
+            self.city = city or profile.city_id
+        self._result = None
+
+    def statement(self):
+        other_users = [User.id != self.user_id] if self.user_id else []
+        columns = []
+        if self.username:
+            columns.append(
+                exists()
+                .where(User.username == self.username, *other_users)
+                .label("username_taken")
+            )
+        if self.phone_number:
+            columns.append(
+                exists()
+                .where(User.phone_number == self.phone_number, *other_users)
+                .label("phone_number_taken")
+            )
+        if self.province:
+            columns.append(
+                exists().where(Province.id == self.province).label("province_exists")
+            )
+            columns.append(
+                exists()
+                .where(City.id == self.city, City.province_id == self.province)
+                .label("city_exists")
+            )
+        return select(*columns) if columns else None
+
+    @property
+    def result(self) -> dict:
+        if self._result is None:
+            statement = self.statement()
+            self._result = (
+                self.db.execute(statement).one()._asdict()
+                if statement is not None
+                else {}
+            )
+        return self._result
+
+    def validate_location(self):
+        if not self.result.get("province_exists"):
+            raise HTTPException(detail="Province not found", status_code=400)
+        if not self.result.get("city_exists"):
+            raise HTTPException(detail="City not found", status_code=400)
+        return {"province_id": self.province, "city_id": self.city}
+
+
+def user_profile_lookup(db, **kwargs):
+    if BATCHED_VALIDATION:
+        return UserProfileLookup(db, **kwargs)
+    return None
+
+
+def commit_user(db):
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            detail="A user with username or phone_number already exists",
+            status_code=400,
+        )
 
 
 class CreateUserValidation(CreateUserValidationInterface):
@@ -18,11 +110,16 @@ class CreateUserValidation(CreateUserValidationInterface):
         username,
         phone_number,
         password,
+        lookup=None,
     ):
         self.db = db
         self.username = username
         self.phone_number = phone_number
         self.password = password
+        self.lookup = lookup
+
+    def other_users(self):
+        return ()
 
     @staticmethod
     def validate_is_strong(value: str) -> str:
@@ -59,16 +156,26 @@ class CreateUserValidation(CreateUserValidationInterface):
 
     def validate_phone_number_exists(self):
         phone_number = self.validate_phone_number(value=self.phone_number)
-        user = self.db.query(User).filter(User.phone_number == phone_number).first()
-        if user is not None:
+        if self.lookup is not None:
+            taken = self.lookup.result["phone_number_taken"]
+        else:
+            taken = self.db.query(
+                exists().where(User.phone_number == phone_number, *self.other_users())
+            ).scalar()
+        if taken:
             raise HTTPException(
                 detail="A user with phone_number already exists", status_code=400
             )
         return phone_number
 
     def validate_username_exists(self):
-        user = self.db.query(User).filter(User.username == self.username).first()
-        if user is not None:
+        if self.lookup is not None:
+            taken = self.lookup.result["username_taken"]
+        else:
+            taken = self.db.query(
+                exists().where(User.username == self.username, *self.other_users())
+            ).scalar()
+        if taken:
             raise HTTPException(
                 detail="A user with username already exists", status_code=400
             )
@@ -77,7 +184,9 @@ class CreateUserValidation(CreateUserValidationInterface):
     def validate_input_data(self):
         username = self.validate_username_exists()
         phone_number = self.validate_phone_number_exists()
-        password = get_hashed_password(self.validate_is_strong(self.password))
+        password = self.validate_is_strong(self.password)
+        release_connection(self.db)
+        password = run_hasher(get_hashed_password, password)
         return {
             "username": username,
             "phone_number": phone_number,
@@ -93,36 +202,19 @@ class UpdateUserValidation(CreateUserValidation):
         username=None,
         phone_number=None,
         password=None,
+        lookup=None,
     ):
         super().__init__(
-            db, username=username, phone_number=phone_number, password=password
+            db,
+            username=username,
+            phone_number=phone_number,
+            password=password,
+            lookup=lookup,
         )
         self.user = user
 
-    def validate_username_exists(self):
-        user = (
-            self.db.query(User)
-            .filter(User.username == self.username, User.id != self.user.id)
-            .first()
-        )
-        if user is not None:
-            raise HTTPException(
-                detail="A user with username already exists", status_code=400
-            )
-        return self.username
-
-    def validate_phone_number_exists(self):
-        phone_number = self.validate_phone_number(value=self.phone_number)
-        user = (
-            self.db.query(User)
-            .filter(User.phone_number == phone_number, User.id != self.user.id)
-            .first()
-        )
-        if user is not None:
-            raise HTTPException(
-                detail="A user with phone_number already exists", status_code=400
-            )
-        return phone_number
+    def other_users(self):
+        return (User.id != self.user.id,)
 
     def validate_input_data(self):
         data = {}
@@ -134,7 +226,8 @@ class UpdateUserValidation(CreateUserValidation):
             data.update({"phone_number": phone_number})
         if self.password:
             password = self.validate_is_strong(self.password)
-            data.update({"phone_number": get_hashed_password(password=password)})
+            release_connection(self.db)
+            data.update({"password": run_hasher(get_hashed_password, password)})
         return data
 
 
@@ -148,6 +241,7 @@ class CreateProfileValidation:
         image=None,
         first_name=None,
         last_name=None,
+        lookup=None,
     ):
         self.db = db
         self.province = province
@@ -156,6 +250,8 @@ class CreateProfileValidation:
         self.image = image
         self.first_name = first_name
         self.last_name = last_name
+        self.lookup = lookup
+        self.staged_image = None
 
     @staticmethod
     def validate_image(value: str) -> str:
@@ -168,26 +264,26 @@ class CreateProfileValidation:
         return value
 
     def load_image_to_media(self):
-        object_folder = BASE_DIR / "media" / f"{self.phone_number}"
-        object_folder.mkdir(parents=True, exist_ok=True)
-        unique_filename = f"{uuid.uuid4()}{Path(self.image.filename).suffix}"
-        file_location = object_folder / unique_filename
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(self.image.file, buffer)
-        return f"/media/{self.phone_number}/{unique_filename}"
+        # the file only gets its final name once the route has committed, see
+        # publish_on_success
+        self.staged_image = stage_image(self.image)
+        return media_path(self.staged_image.key)
 
-    def validate_input_data(self):
+    def validate_location(self, province_id, city_id):
+        if self.lookup is not None:
+            return self.lookup.validate_location()
         base_validation = BaseValidation(self.db)
-        province = base_validation.validate_province(self.province)
-        city = base_validation.validate_city(self.city, self.province)
-        data = {
-            "province": province,
-            "city": city,
-        }
+        province = base_validation.validate_province(province_id)
+        city = base_validation.validate_city(province_id, city_id)
+        return {"province": province, "city": city}
+
+    def validate_input_data(self):
+        data = self.validate_location(self.province, self.city)
         if self.image:
             self.validate_image(self.image.filename)
             image_path = self.load_image_to_media()
-            data.update({"image": image_path})
+            # variants of the previous image are regenerated after commit
+            data.update({"image": image_path, "image_variants": None})
         if self.first_name:
             data.update({"first_name": self.first_name})
         if self.last_name:
@@ -199,12 +295,14 @@ class UpdateProfileValidation(CreateProfileValidation):
     def __init__(
         self,
         db,
+        profile,
         phone_number,
         province=None,
         city=None,
         image=None,
         first_name=None,
         last_name=None,
+        lookup=None,
     ):
         super().__init__(
             db,
@@ -214,21 +312,25 @@ class UpdateProfileValidation(CreateProfileValidation):
             image=image,
             first_name=first_name,
             last_name=last_name,
+            lookup=lookup,
         )
+        self.profile = profile
 
     def validate_input_data(self):
         data = {}
-        base_validation = BaseValidation(self.db)
-        if self.province:
-            province = base_validation.validate_province_id(self.province)
-            data.update({"province": province})
-        if self.city:
-            city = base_validation.validate_province_id(self.city, self.province)
-            data.update({"city": city})
+        if self.province or self.city:
+            # a new province must still contain the current city and vice versa
+            data.update(
+                self.validate_location(
+                    self.province or self.profile.province_id,
+                    self.city or self.profile.city_id,
+                )
+            )
         if self.image:
             self.validate_image(self.image.filename)
             image_path = self.load_image_to_media()
-            data.update({"image": image_path})
+            # variants of the previous image are regenerated after commit
+            data.update({"image": image_path, "image_variants": None})
         if self.first_name:
             data.update({"first_name": self.first_name})
         if self.last_name:
@@ -0,0 +1,116 @@
+"""Sustained chat message inserts, in messages/s: one transaction per message
+(what a naive WebSocket handler does) against the group committing
+MessageWriter used by the WebSocket path. Both keep the members' inbox rows
+up to date.
+
+`--producers` coroutines (think sockets) send `--messages` messages in total,
+spread over `--conversations` conversations owned by a bench_chat user; all
+of it is removed again afterwards:
+
+    python -m benchmarks.chat_messages --messages 100000 --window 0.005
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import delete
+
+from app.database import AsyncSessionLocal
+from app.helpers import chat_store
+from app.helpers.chat_store import MessageWriter
+from app.models.chat import Conversation, Membership
+from app.models.users import User
+from app.schemas.chat import MessageFrame
+
+
+def frames(args, conversation_ids, producer):
+    for n in range(producer, args.messages, args.producers):
+        yield MessageFrame(
+            type="message",
+            conversation_id=conversation_ids[n % len(conversation_ids)],
+            body=f"message {n}",
+            client_id=str(n),
+        )
+
+
+async def per_message(args, sender, conversation_ids):
+    writer = MessageWriter()
+
+    async def produce(producer):
+        for frame in frames(args, conversation_ids, producer):
+            # the same statements, inbox updates included, for a batch of one
+            await writer.insert([(sender, frame)])
+
+    await asyncio.gather(*(produce(producer) for producer in range(args.producers)))
+
+
+async def group_commit(args, sender, conversation_ids):
+    writer = MessageWriter()
+
+    async def produce(producer):
+        for frame in frames(args, conversation_ids, producer):
+            while not writer.submit(sender, frame):
+                # the writer is behind, as a socket would be told to retry
+                await asyncio.sleep(0.001)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(produce(producer) for producer in range(args.producers)))
+    await writer.stop()
+    print(f"    {writer.batches} commits, {writer.failed} failed")
+
+
+CASES = [("per message", per_message), ("group commit", group_commit)]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--producers", type=int, default=15)
+    parser.add_argument("--conversations", type=int, default=100)
+    parser.add_argument("--window", type=float, default=chat_store.CHAT_COMMIT_WINDOW)
+    parser.add_argument(
+        "--batch-size", type=int, default=chat_store.CHAT_COMMIT_BATCH_SIZE
+    )
+    args = parser.parse_args()
+    chat_store.CHAT_COMMIT_WINDOW = args.window
+    chat_store.CHAT_COMMIT_BATCH_SIZE = args.batch_size
+
+    async with AsyncSessionLocal() as session:
+        user = User(username="bench_chat", phone_number="b0000000000")
+        session.add(user)
+        await session.flush()
+        conversations = [
+            Conversation(
+                title="bench_chat",
+                created_by=user.id,
+                memberships=[Membership(user_id=user.id)],
+            )
+            for _ in range(args.conversations)
+        ]
+        session.add_all(conversations)
+        await session.commit()
+        sender = SimpleNamespace(user_id=user.id, send=lambda frame: True)
+        conversation_ids = [conversation.id for conversation in conversations]
+    try:
+        for label, run in CASES:
+            print(label)
+            started = time.perf_counter()
+            await run(args, sender, conversation_ids)
+            seconds = time.perf_counter() - started
+            print(
+                f"    {args.messages / seconds:10,.0f} messages/s "
+                f"({args.messages} messages, {seconds:.2f}s)"
+            )
+    finally:
+        async with AsyncSessionLocal() as session:
+            # messages go with their conversations
+            await session.execute(
+                delete(Conversation).filter(Conversation.title == "bench_chat")
+            )
+            await session.execute(delete(User).filter(User.username == "bench_chat"))
+            await session.commit()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
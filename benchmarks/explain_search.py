@@ -0,0 +1,92 @@
+"""Asserts that the text filters of ProvinceFilter, CityFilter and
+ProfileFilter are planned as index scans in every search mode.
+
+Sequential scans are disabled for the check so the result does not depend on
+how many rows the target database holds. Run against a migrated database:
+
+    python -m benchmarks.explain_search
+"""
+import sys
+
+from sqlalchemy import text
+
+from app.database import SessionLocal
+from app.helpers.filter import CityFilter, ProfileFilter, ProvinceFilter, SearchMode
+from app.helpers.helper_func import count_query
+
+
+CASES = [
+    (
+        "province.name",
+        lambda mode: ProvinceFilter().filter(name="teh", search_mode=mode),
+        {
+            SearchMode.contains: "ix_province_name_trgm",
+            SearchMode.prefix: "ix_province_name_trgm",
+            SearchMode.exact: "ix_province_name",
+        },
+    ),
+    (
+        "city.name",
+        lambda mode: CityFilter().filter(name="teh", search_mode=mode),
+        {
+            SearchMode.contains: "ix_city_name_trgm",
+            SearchMode.prefix: "ix_city_name_trgm",
+            SearchMode.exact: "ix_city_name",
+        },
+    ),
+    (
+        "user.username",
+        lambda mode: ProfileFilter().filter(username="admin", search_mode=mode),
+        {
+            SearchMode.contains: "ix_user_username_trgm",
+            SearchMode.prefix: "ix_user_username_trgm",
+            SearchMode.exact: "ix_user_username",
+        },
+    ),
+    (
+        "user.phone_number",
+        lambda mode: ProfileFilter().filter(phone_number="0912", search_mode=mode),
+        {
+            SearchMode.contains: "ix_user_phone_number_trgm",
+            SearchMode.prefix: "ix_user_phone_number_trgm",
+            SearchMode.exact: "ix_user_phone_number",
+        },
+    ),
+]
+
+
+def index_names(plan: dict) -> set:
+    names = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        names |= index_names(child)
+    return names
+
+
+def explain(session, query) -> set:
+    connection = session.connection()
+    compiled = count_query(query).compile(dialect=connection.dialect)
+    plan = connection.exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+    ).scalar()
+    return index_names(plan[0]["Plan"])
+
+
+def main() -> int:
+    failures = 0
+    with SessionLocal() as session:
+        session.execute(text("SET LOCAL enable_seqscan = off"))
+        for label, build, expected in CASES:
+            for mode, index in expected.items():
+                used = explain(session, build(mode))
+                ok = index in used
+                failures += not ok
+                print(
+                    f"{'ok' if ok else 'FAIL':4} {label:18} {mode.value:8} "
+                    f"expected {index}, plan uses {sorted(used) or 'no index'}"
+                )
+        session.rollback()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+"""Compares JWT verification with and without the verified-token cache used
+by JWTBearer:
+
+    python -m benchmarks.jwt_cache [iterations]
+"""
+import sys
+import timeit
+from types import SimpleNamespace
+
+from app.helpers.auth_tools import decode_jwt, decode_jwt_cached, sign_jwt, token_cache
+
+
+def main(iterations: int = 100_000):
+    user = SimpleNamespace(
+        id=1,
+        username="admin",
+        phone_number="09120000000",
+        is_active=True,
+        is_staff=True,
+    )
+    token = sign_jwt(user)["access_token"]
+    token_cache.clear()
+    for label, func in [("uncached", decode_jwt), ("cached", decode_jwt_cached)]:
+        seconds = timeit.timeit(lambda: func(token), number=iterations)
+        print(
+            f"{label:9} {iterations / seconds:12,.0f} verifications/s "
+            f"{seconds / iterations * 1e6:8.2f} us/op"
+        )
+    print("cache", token_cache.stats())
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
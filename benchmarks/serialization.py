@@ -0,0 +1,129 @@
+"""Times the response serialization of the list and detail endpoints, without
+the database: FastAPI's default path (response_model validation or
+jsonable_encoder, then JSONResponse) against the paths the routers use now.
+
+    python -m benchmarks.serialization [page_size] [iterations]
+"""
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.helpers import responses
+from app.helpers.responses import PreparedJSONResponse, dump_validated, json_response
+from app.schemas.base import PaginatedCityResponse, PaginatedProvinceResponse
+from app.schemas.users import PaginatedProfileResponse, ProfileDetailResponse
+
+
+def province_page(size):
+    provinces = [SimpleNamespace(id=i, name=f"province {i}") for i in range(size)]
+    return {"total": size, "skip": 0, "limit": size, "provinces": provinces}
+
+
+def city_page(size):
+    province = SimpleNamespace(id=1, name="province")
+    cities = [
+        SimpleNamespace(id=i, name=f"city {i}", province=province) for i in range(size)
+    ]
+    return {"total": size, "skip": 0, "limit": size, "cities": cities}
+
+
+def profile_item(i):
+    return {
+        "id": i,
+        "user_id": i,
+        "username": f"user{i}",
+        "phone_number": f"0912{i:07d}",
+        "city": {"id": 1, "name": "city"},
+        "province": {"id": 1, "name": "province"},
+        "is_active": True,
+        "is_staff": False,
+        "image_variants": {
+            "thumb": f"http://127.0.0.1:8000/media/{i}.thumb.webp",
+            "medium": f"http://127.0.0.1:8000/media/{i}.medium.webp",
+        },
+    }
+
+
+def profile_page(size):
+    profiles = [profile_item(i) for i in range(size)]
+    return {"total": size, "skip": 0, "limit": size, "profiles": profiles}
+
+
+def profile_detail(size):
+    item = profile_item(1)
+    return {
+        "image": "http://127.0.0.1:8000/media/1.png",
+        "image_variants": item["image_variants"],
+        "first_name": "first",
+        "last_name": "last",
+        "username": item["username"],
+        "phone_number": item["phone_number"],
+        "is_active": True,
+        "is_staff": False,
+        "city": item["city"],
+        "province": item["province"],
+    }
+
+
+async def fastapi_default(field, content):
+    body = await serialize_response(field=field, response_content=content)
+    return JSONResponse(body).body
+
+
+async def orjson_response(model, content):
+    return json_response(model, content).body
+
+
+async def cached_json(model, content):
+    # the page was validated and serialized once when it was cached
+    return PreparedJSONResponse(content).body
+
+
+# (endpoint, schema, payload builder, response_model on the route, new paths)
+CASES = [
+    ("province_list", PaginatedProvinceResponse, province_page, True, "cached"),
+    ("city_list", PaginatedCityResponse, city_page, True, "cached"),
+    ("users_list", PaginatedProfileResponse, profile_page, False, "orjson"),
+    ("users_deatil", ProfileDetailResponse, profile_detail, False, "orjson"),
+]
+
+
+async def timed(label, func, iterations, *args):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await func(*args)
+    seconds = time.perf_counter() - started
+    print(f"    {label:24} {seconds / iterations * 1e6:10.1f} us/response")
+
+
+async def main(page_size: int = 100, iterations: int = 2000):
+    for endpoint, model, build, response_model, path in CASES:
+        content = build(page_size)
+        print(endpoint)
+        # created once per route by FastAPI; routes without response_model only
+        # run jsonable_encoder
+        field = (
+            create_model_field("Response", model, mode="serialization")
+            if response_model
+            else None
+        )
+        await timed("fastapi default", fastapi_default, iterations, field, content)
+        if path == "cached":
+            cached = dump_validated(model, content)
+            await timed(
+                "validated once, cached", cached_json, iterations, model, cached
+            )
+        else:
+            for validate in (True, False):
+                responses.VALIDATE_RESPONSES = validate
+                label = "orjson, validated" if validate else "orjson, no validation"
+                await timed(label, orjson_response, iterations, model, content)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*map(int, sys.argv[1:])))
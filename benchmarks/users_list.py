@@ -0,0 +1,141 @@
+"""Compares the old joinedload query, the ORM path and the lean (column
+projected) path of ProfileFilter used by users_list, in rows/s including
+building the response dicts.
+
+Seeds `rows` profiles named bench_* into the configured database with
+generate_series (removed again afterwards unless --keep is given) and then
+reads all of them back in keyset pages of `--page-size`:
+
+    python -m benchmarks.users_list --rows 1000000
+"""
+import argparse
+import time
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import joinedload
+
+from app.database import SessionLocal
+from app.helpers.filter import ProfileFilter, SearchMode, profile_list_item, search
+from app.helpers.image_variants import variant_urls
+from app.models.base import City, Province
+from app.models.users import Profile, User
+
+
+SEED = [
+    "INSERT INTO province (name) VALUES ('bench_province')",
+    "INSERT INTO city (name, province_id) "
+    "SELECT 'bench_city', id FROM province WHERE name = 'bench_province'",
+    'INSERT INTO "user" (username, phone_number, is_active, is_staff) '
+    "SELECT 'bench_' || n, 'b' || lpad(n::text, 10, '0'), true, false "
+    "FROM generate_series(1, :rows) AS n",
+    "INSERT INTO profile (user_id, province_id, city_id) "
+    'SELECT u.id, c.province_id, c.id FROM "user" u, city c '
+    "WHERE u.username LIKE 'bench\\_%' AND c.name = 'bench_city'",
+]
+CLEANUP = [
+    'DELETE FROM profile USING "user" u '
+    "WHERE profile.user_id = u.id AND u.username LIKE 'bench\\_%'",
+    "DELETE FROM \"user\" WHERE username LIKE 'bench\\_%'",
+    "DELETE FROM city WHERE name = 'bench_city'",
+    "DELETE FROM province WHERE name = 'bench_province'",
+]
+
+
+def orm_page(session, query):
+    return [
+        {
+            "id": profile.id,
+            "user_id": profile.user_id,
+            "username": profile.user.username,
+            "phone_number": profile.user.phone_number,
+            "city": {"id": profile.city.id, "name": profile.city.name},
+            "province": {"id": profile.province.id, "name": profile.province.name},
+            "is_active": profile.user.is_active,
+            "is_staff": profile.user.is_staff,
+            "image_variants": variant_urls(profile),
+        }
+        for profile in session.scalars(query)
+    ]
+
+
+def lean_page(session, query):
+    return [profile_list_item(row) for row in session.execute(query)]
+
+
+def joinedload_query():
+    # ProfileFilter before the lean path: explicit joins for the filters plus
+    # joinedload of the same relationships
+    return (
+        select(Profile)
+        .join(User)
+        .join(Province)
+        .join(City)
+        .options(
+            joinedload(Profile.user),
+            joinedload(Profile.city),
+            joinedload(Profile.province),
+        )
+        .filter(search(User.username, "bench_", SearchMode.prefix))
+        .order_by(Profile.id.desc())
+    )
+
+
+def profile_query(lean):
+    return ProfileFilter().filter(
+        username="bench_", search_mode=SearchMode.prefix, lean=lean
+    )
+
+
+CASES = [
+    ("joinedload", orm_page, joinedload_query),
+    ("orm", orm_page, lambda: profile_query(lean=False)),
+    ("lean", lean_page, lambda: profile_query(lean=True)),
+]
+
+
+def measure(label, fetch, build, page_size):
+    fetched = 0
+    last_id = None
+    with SessionLocal() as session:
+        started = time.perf_counter()
+        while True:
+            # keyset pages, as users_list does with cursors
+            query = build().limit(page_size)
+            if last_id is not None:
+                query = query.filter(Profile.id < last_id)
+            page = fetch(session, query)
+            if not page:
+                break
+            fetched += len(page)
+            last_id = page[-1]["id"]
+            session.expunge_all()
+        seconds = time.perf_counter() - started
+    print(
+        f"{label:10} {fetched / seconds:12,.0f} rows/s ({fetched} rows, {seconds:.2f}s)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    with SessionLocal() as session:
+        for statement in SEED:
+            session.execute(text(statement), {"rows": args.rows})
+        session.commit()
+    try:
+        for label, fetch, build in CASES:
+            measure(label, fetch, build, args.page_size)
+    finally:
+        if not args.keep:
+            with SessionLocal() as session:
+                for statement in CLEANUP:
+                    session.execute(text(statement))
+                session.commit()
+
+
+if __name__ == "__main__":
+    main()